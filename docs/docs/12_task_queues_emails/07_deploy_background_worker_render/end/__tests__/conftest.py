@@ -0,0 +1,36 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import mailgun
+
+
+@pytest.fixture()
+def stand_in(monkeypatch):
+    """Local HTTP stand-in for the Mailgun API, answering with `statuses`."""
+    statuses = []
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            requests_seen.append((self.path, self.client_address, body))
+            status = statuses.pop(0) if statuses else 200
+            self.send_response(status)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(mailgun, "API_URL", f"http://127.0.0.1:{server.server_port}/v3")
+    monkeypatch.setattr(mailgun, "_session", None)
+    yield statuses, requests_seen
+    server.shutdown()
+    server.server_close()
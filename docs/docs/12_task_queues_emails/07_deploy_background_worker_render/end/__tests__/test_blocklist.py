@@ -0,0 +1,74 @@
+import time
+
+import pytest
+from flask_jwt_extended import decode_token
+
+from blocklist import FilteredBlocklist, RedisBlocklist
+
+
+@pytest.fixture()
+def redis_blocklist(fake_redis):
+    return RedisBlocklist(fake_redis)
+
+
+def test_ttl_is_the_token_remaining_lifetime(fake_redis, redis_blocklist):
+    redis_blocklist.add("jti-1", time.time() + 600)
+
+    assert fake_redis.ttl("jwt-blocklist:jti-1") == 600
+    assert "jti-1" in redis_blocklist
+
+
+def test_expired_token_is_not_stored(fake_redis, redis_blocklist):
+    published = []
+    redis_blocklist.subscribe(published.append)
+
+    redis_blocklist.add("jti-1", time.time() - 10)
+
+    assert "jti-1" not in redis_blocklist
+    assert fake_redis.values == {}
+    assert published == []
+
+
+def test_revoked_lists_live_tokens(fake_redis, redis_blocklist):
+    redis_blocklist.add("jti-1", time.time() + 600)
+    redis_blocklist.add("jti-2", time.time() + 600)
+    fake_redis.set("jwt-blocklist:jti-3", "", ex=60)
+    fake_redis.expiry["jwt-blocklist:jti-3"] = time.time() - 1
+    fake_redis.set("idempotency:other", "")
+
+    assert sorted(redis_blocklist.revoked()) == ["jti-1", "jti-2"]
+    assert "jti-3" not in redis_blocklist
+
+
+def test_filter_learns_revocations_from_other_workers(fake_redis):
+    this_worker = FilteredBlocklist(RedisBlocklist(fake_redis), rebuild_interval=0)
+    other_worker = RedisBlocklist(fake_redis)
+
+    assert "jti-1" not in this_worker.filter
+    other_worker.add("jti-1", time.time() + 600)
+
+    assert "jti-1" in this_worker.filter
+    assert "jti-1" in this_worker
+    assert this_worker.stats["revoked"] == 1
+
+
+def test_filter_is_rebuilt_from_redis(fake_redis):
+    RedisBlocklist(fake_redis).add("jti-1", time.time() + 600)
+
+    filtered = FilteredBlocklist(RedisBlocklist(fake_redis), rebuild_interval=0)
+
+    assert "jti-1" in filtered.filter
+
+
+def test_logout_stores_token_until_it_expires(client, app, jwt, fake_redis, monkeypatch):
+    monkeypatch.setattr("blocklist.redis.from_url", lambda url: fake_redis)
+    app.config["JWT_BLOCKLIST_BACKEND"] = "redis"
+    with app.app_context():
+        token = decode_token(jwt)
+
+    response = client.post("/logout", headers={"Authorization": f"Bearer {jwt}"})
+
+    assert response.status_code == 200
+    ttl = fake_redis.ttl(f"jwt-blocklist:{token['jti']}")
+    assert abs(ttl - (token["exp"] - time.time())) <= 2
+    assert client.get("/item", headers={"Authorization": f"Bearer {jwt}"}).status_code == 401
@@ -0,0 +1,39 @@
+import mailgun
+
+
+def test_sends_reuse_the_connection(stand_in):
+    _, requests_seen = stand_in
+
+    first = mailgun.post("example.com/messages", data={"to": "a@example.com"})
+    second = mailgun.post("example.com/messages", data={"to": "b@example.com"})
+
+    assert first.status_code == second.status_code == 200
+    assert requests_seen[0][0] == "/v3/example.com/messages"
+    # Same client port, so one TCP connection
+    assert requests_seen[0][1] == requests_seen[1][1]
+    assert first.timings["connect"] > 0
+    assert second.timings["connect"] == 0
+    assert second.timings["request"] > 0
+
+
+def test_retries_unavailable_responses(stand_in, monkeypatch):
+    statuses, requests_seen = stand_in
+    statuses.extend([503, 429])
+    monkeypatch.setattr(mailgun, "RETRY_BACKOFF", 0)
+
+    response = mailgun.post("example.com/messages", data={"to": "a@example.com"})
+
+    assert response.status_code == 200
+    assert len(requests_seen) == 3
+
+
+def test_does_not_retry_gateway_errors(stand_in, monkeypatch):
+    statuses, requests_seen = stand_in
+    statuses.append(502)
+    monkeypatch.setattr(mailgun, "RETRY_BACKOFF", 0)
+
+    response = mailgun.post("example.com/messages", data={"to": "a@example.com"})
+
+    # Mailgun may have accepted the email before the gateway failed
+    assert response.status_code == 502
+    assert len(requests_seen) == 1
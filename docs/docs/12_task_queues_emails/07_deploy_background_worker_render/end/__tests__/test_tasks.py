@@ -0,0 +1,132 @@
+import json
+from urllib.parse import parse_qs
+
+import jinja2
+import pytest
+
+import mailgun
+import tasks
+from tasks import render_template, send_registration_emails
+
+RECIPIENTS = [
+    {"email": "jose@example.com", "username": "jose"},
+    {"email": "rolf@example.com", "username": "rolf"},
+]
+
+
+def test_registration_emails_are_sent_in_one_request(stand_in):
+    _, requests_seen = stand_in
+
+    failed, unknown = send_registration_emails(RECIPIENTS)
+
+    assert failed == [] and unknown == []
+    assert len(requests_seen) == 1
+    data = parse_qs(requests_seen[0][2].decode())
+    assert data["to"] == ["jose@example.com", "rolf@example.com"]
+    assert json.loads(data["recipient-variables"][0]) == {
+        "jose@example.com": {"username": "jose"},
+        "rolf@example.com": {"username": "rolf"},
+    }
+    assert "%recipient.username%" in data["html"][0]
+
+
+def test_rejected_batch_returns_every_recipient_as_failed(stand_in):
+    statuses, _ = stand_in
+    statuses.append(400)
+
+    assert send_registration_emails(RECIPIENTS) == (RECIPIENTS, [])
+
+
+def test_batch_that_may_have_been_accepted_is_unknown(stand_in):
+    statuses, requests_seen = stand_in
+    statuses.append(502)
+
+    assert send_registration_emails(RECIPIENTS) == ([], RECIPIENTS)
+    assert len(requests_seen) == 1
+
+
+def test_batch_without_connection_returns_every_recipient_as_failed(monkeypatch):
+    monkeypatch.setattr(mailgun, "API_URL", "http://127.0.0.1:1/v3")
+    monkeypatch.setattr(mailgun, "RETRIES", 0)
+    monkeypatch.setattr(mailgun, "_session", None)
+
+    assert send_registration_emails(RECIPIENTS) == (RECIPIENTS, [])
+
+
+def refuse_to_compile(*args, **kwargs):
+    raise AssertionError("Compiled a template at render time.")
+
+
+def test_render_does_not_touch_the_filesystem(monkeypatch):
+    def get_source(*args):
+        raise AssertionError("Loaded a template at render time.")
+
+    monkeypatch.setattr(tasks.template_loader, "get_source", get_source)
+
+    assert "jose" in render_template("email/action.html", username="jose")
+
+
+def test_bytecode_cache_skips_compiling(tmp_path, monkeypatch):
+    def build_env():
+        return jinja2.Environment(
+            loader=tasks.SourceLoader(tasks.TEMPLATES_DIR),
+            bytecode_cache=jinja2.FileSystemBytecodeCache(str(tmp_path)),
+        )
+
+    build_env().get_template("email/action.html")
+
+    fresh_env = build_env()
+    monkeypatch.setattr(fresh_env, "compile", refuse_to_compile)
+    assert "jose" in fresh_env.get_template("email/action.html").render(username="jose")
+
+
+def test_renders_reuse_the_compiled_template(monkeypatch):
+    monkeypatch.setattr(tasks.template_env, "compile", refuse_to_compile)
+
+    for username in ["jose", "rolf", "anne"]:
+        assert username in render_template("email/action.html", username=username)
+
+
+def test_precompiled_templates_load_without_compiling(tmp_path, monkeypatch):
+    jinja2.Environment(loader=tasks.SourceLoader(tasks.TEMPLATES_DIR)).compile_templates(
+        str(tmp_path), zip=None, ignore_errors=False
+    )
+    env = jinja2.Environment(loader=jinja2.ModuleLoader(str(tmp_path)))
+    monkeypatch.setattr(env, "compile", refuse_to_compile)
+
+    assert "jose" in env.get_template("email/action.html").render(username="jose")
+
+
+def test_templates_render_from_sources_until_built():
+    loader = tasks.SourceLoader(tasks.TEMPLATES_DIR)
+
+    assert loader.list_templates() == ["email/action.html"]
+    source, filename, _ = loader.get_source(jinja2.Environment(), "email/action.html")
+    assert filename.endswith("action.original.html")
+
+
+def test_unbuilt_templates_are_inlined_when_loaded():
+    html = render_template("email/action.html", username="jose")
+
+    assert "username jose has" in html
+    assert 'class="btn-primary"' in html and "background-color:#348eda" in html
+    source, _, _ = tasks.template_loader.get_source(jinja2.Environment(), "email/action.html")
+    assert "background-color:#348eda" in source
+
+
+def test_build_inlines_and_compiles_templates(app, tmp_path):
+    pytest.importorskip("premailer")
+
+    result = app.test_cli_runner().invoke(args=["build-email-templates", "--output", str(tmp_path)])
+
+    assert result.exit_code == 0, result.output
+    html = (tmp_path / "html" / "email" / "action.html").read_text()
+    assert "{{ username }}" in html
+    assert 'class="btn-primary"' in html and "background-color:#348eda" in html
+    # Media queries can't be inlined, they stay in a style tag
+    assert "@media only screen and (max-width: 640px)" in html
+
+    env = jinja2.Environment(loader=jinja2.ModuleLoader(str(tmp_path)))
+    rendered = env.get_template("email/action.html").render(username="jose")
+    assert "username jose has" in rendered
+    assert "<style" in rendered and "background-color:#348eda" in rendered
@@ -8,12 +8,18 @@ from dotenv import load_dotenv
 
 
 from db import db
-from blocklist import BLOCKLIST
+from blocklist import get_blocklist, is_token_version_current
+from cache import response_cache
+from catalog import catalog_cli
+from claims import grant_role, user_claims
+from passwords import calibrate_password_hashing
+from tasks import build_email_templates
 
 from resources.item import blp as ItemBlueprint
 from resources.store import blp as StoreBlueprint
 from resources.tag import blp as TagBlueprint
 from resources.user import blp as UserBlueprint
+from resources.catalog import blp as CatalogBlueprint
 
 
 def create_app(db_url=None):
@@ -31,14 +37,59 @@ def create_app(db_url=None):
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.init_app(app)
     migrate = Migrate(app, db)
+
+    # "lru" is per process, use "redis" when running more than one worker
+    app.config["RESPONSE_CACHE_BACKEND"] = os.getenv("RESPONSE_CACHE_BACKEND", "lru")
+    app.config["RESPONSE_CACHE_DEFAULT_TTL"] = 60
+    app.config["RESPONSE_CACHE_TTL"] = {
+        "Items.Item": 300,
+        "stores.Store": 60,
+        "Tags.TagsInStore": 60,
+        "Tags.Tag": 300,
+    }
+    response_cache.init_app(app)
+
+    # POST /item/bulk limits
+    app.config["ITEM_BULK_MAX_ROWS"] = 10_000
+    app.config["ITEM_BULK_BATCH_SIZE"] = 500
+    # Stores with more items are deleted by the worker, CHUNK_SIZE at a time
+    app.config["STORE_DELETE_ASYNC_THRESHOLD"] = 10_000
+    app.config["STORE_DELETE_CHUNK_SIZE"] = 1_000
+    # POST /ingest payloads wait in Redis for the worker
+    app.config["INGEST_MAX_BYTES"] = 256 * 1024 * 1024
+    app.config["INGEST_PAYLOAD_TTL"] = 24 * 60 * 60
+    app.config["INGEST_BATCH_SIZE"] = 1_000
+    # Idempotency-Key responses, shared through Redis unless "memory"
+    app.config["IDEMPOTENCY_BACKEND"] = os.getenv("IDEMPOTENCY_BACKEND", "redis")
+    app.config["IDEMPOTENCY_TTL"] = 24 * 60 * 60
+    # How long a key stays claimed by a request that never finishes
+    app.config["IDEMPOTENCY_LOCK_TIMEOUT"] = 60
+    # How long a retry waits for the first request before giving up with 409
+    app.config["IDEMPOTENCY_WAIT"] = 10
     api = Api(app)
 
+    app.config["PASSWORD_SCHEMES"] = os.getenv("PASSWORD_SCHEMES", "pbkdf2_sha256").split(",")
+    app.config["PASSWORD_ROUNDS"] = int(os.getenv("PASSWORD_ROUNDS", 0)) or None
+    app.cli.add_command(calibrate_password_hashing)
+    app.cli.add_command(grant_role)
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(build_email_templates)
+
     app.config["JWT_SECRET_KEY"] = "jose"
+    app.config["JWT_BLOCKLIST_BACKEND"] = os.getenv("JWT_BLOCKLIST_BACKEND", "redis")
+    # Check tokens against a local Bloom filter before asking the backend
+    app.config["JWT_BLOCKLIST_FILTER"] = os.getenv("JWT_BLOCKLIST_FILTER", "1") == "1"
+    # How long a worker may keep accepting tokens after a user's revoke-all
+    app.config["JWT_TOKEN_VERSION_CACHE_TTL"] = 10
+    # How long a worker may keep issuing tokens with a user's previous roles
+    app.config["JWT_CLAIMS_CACHE_TTL"] = 60
     jwt = JWTManager(app)
 
     @jwt.token_in_blocklist_loader
     def check_if_token_in_blocklist(jwt_header, jwt_payload):
-        return jwt_payload["jti"] in BLOCKLIST
+        return jwt_payload["jti"] in get_blocklist() or not is_token_version_current(
+            jwt_payload
+        )
 
     @jwt.revoked_token_loader
     def revoked_token_callback(jwt_header, jwt_payload):
@@ -63,10 +114,7 @@ def create_app(db_url=None):
 
     @jwt.additional_claims_loader
     def add_claims_to_jwt(identity):
-        # Look in the database and see whether the user is an admin
-        if identity == 1:
-            return {"is_admin": True}
-        return {"is_admin": False}
+        return user_claims(int(identity))
 
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
@@ -100,5 +148,6 @@ def create_app(db_url=None):
     api.register_blueprint(StoreBlueprint)
     api.register_blueprint(TagBlueprint)
     api.register_blueprint(UserBlueprint)
+    api.register_blueprint(CatalogBlueprint)
 
     return app
\ No newline at end of file
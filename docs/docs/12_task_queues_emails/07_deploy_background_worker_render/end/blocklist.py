@@ -1,9 +1,324 @@
 """
 blocklist.py
 
-This file just contains the blocklist of the JWT tokens. It will be imported by
-app and the logout resource so that tokens can be added to the blocklist when the
-user logs out.
+This file contains the blocklist of revoked JWT tokens. It is used by app (to
+reject revoked tokens) and the logout resource (to revoke them).
+
+Each revoked token id (jti) is only kept until the token expires, since an
+expired token is rejected anyway. Two backends are available, chosen with the
+`JWT_BLOCKLIST_BACKEND` config value:
+
+- `redis`: shared by every gunicorn worker, so a logout is seen by all of them.
+  Each jti is stored with a TTL equal to the token's remaining lifetime.
+- `memory`: a per-process dict, for tests and local development.
+
+Almost no token presented to the API is revoked, so unless
+`JWT_BLOCKLIST_FILTER` is off the backend sits behind a local Bloom filter
+(`FilteredBlocklist`). A token the filter has never seen skips the backend
+lookup entirely; only possible positives go to the backend. With the `redis`
+backend each revocation is also appended to a Redis stream, which every worker
+follows from the last entry it read, so a worker that was disconnected catches
+up instead of missing revocations. While a worker is not in sync with the
+stream, its lookups skip the filter and go to Redis.
+
+To revoke every token of a user at once (log out everywhere, account deletion)
+`revoke_all_tokens` increments the user's `token_version`. Tokens carry the
+version they were issued with in the `token_version` claim, and
+`is_token_version_current` compares it with the user's current version. That
+lookup is cached per process for `JWT_TOKEN_VERSION_CACHE_TTL` seconds, so
+other workers reject the old tokens at most that long after the increment.
 """
+import logging
+import threading
+import time
+from collections import Counter
+
+import redis
+from flask import current_app
+
+from bloom import BloomFilter
+from cache import TTLCache
+from db import db
+from models import UserModel
+from settings import REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryBlocklist:
+    def __init__(self):
+        self._expires_at = {}
+
+    def add(self, jti, expires_at):
+        self._expires_at[jti] = expires_at
+
+    def __contains__(self, jti):
+        expires_at = self._expires_at.get(jti)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            del self._expires_at[jti]
+            return False
+        return True
+
+    def revoked(self):
+        now = time.time()
+        return [jti for jti, expires_at in self._expires_at.items() if expires_at > now]
+
+    # Every revocation happens in this process, the filter never misses one
+    in_sync = True
+
+    def subscribe(self, callback, on_gap):
+        pass
+
+
+class RedisBlocklist:
+    """Revoked jtis as Redis keys, plus a stream of revocations to follow.
+
+    `subscribe` starts a thread following the stream, unless `follow` is off
+    (tests call `follow_once` instead). The blocklist is `in_sync` while the
+    stream has been read to its end within the last `MAX_SYNC_AGE` seconds.
+    """
+
+    MAX_SYNC_AGE = 5
+    READ_COUNT = 1000
+    STREAM_MAXLEN = 100_000
+
+    def __init__(self, connection, prefix="jwt-blocklist:", follow=True):
+        self.connection = connection
+        self.prefix = prefix
+        self.stream = prefix + "revoked"
+        self.follow = follow
+        self._callback = None
+        self._on_gap = None
+        self._last_id = None
+        self._synced_at = None
+        self._gap = False
+
+    def add(self, jti, expires_at):
+        ttl = int(expires_at - time.time()) + 1
+        if ttl > 0:
+            pipe = self.connection.pipeline()
+            pipe.set(self.prefix + jti, "", ex=ttl)
+            pipe.xadd(
+                self.stream, {"jti": jti}, maxlen=self.STREAM_MAXLEN, approximate=True
+            )
+            pipe.execute()
+
+    def __contains__(self, jti):
+        # A single O(1) round trip per request
+        return self.connection.exists(self.prefix + jti) == 1
+
+    def revoked(self):
+        prefix_length = len(self.prefix)
+        for key in self.connection.scan_iter(match=self.prefix + "*", count=1000):
+            key = key.decode()
+            if key != self.stream:
+                yield key[prefix_length:]
+
+    @property
+    def in_sync(self):
+        synced_at = self._synced_at
+        if synced_at is None:
+            return False
+        return time.monotonic() - synced_at < self.MAX_SYNC_AGE
+
+    def subscribe(self, callback, on_gap):
+        """Call `callback(jti)` for every token revoked by any worker from now on.
+
+        `on_gap()` is called after the stream could not be read, before reading
+        it again: revocations may have been trimmed from it meanwhile.
+        """
+        self._callback = callback
+        self._on_gap = on_gap
+        latest = self.connection.xrevrange(self.stream, count=1)
+        self._last_id = latest[0][0] if latest else "0-0"
+        self._synced_at = time.monotonic()
+        if self.follow:
+            threading.Thread(target=self._follow_forever, daemon=True).start()
+
+    def follow_once(self, block=None):
+        """Pass on the revocations added since the last read. False if it failed."""
+        try:
+            if self._gap:
+                self._on_gap()
+                self._gap = False
+            response = self.connection.xread(
+                {self.stream: self._last_id}, count=self.READ_COUNT, block=block
+            )
+        except Exception:
+            logger.exception("Could not read the revocation stream, retrying.")
+            self._synced_at = None
+            self._gap = True
+            return False
+
+        entries = response[0][1] if response else []
+        for entry_id, fields in entries:
+            self._callback(fields[b"jti"].decode())
+            self._last_id = entry_id
+        # A full batch means more entries are waiting, we're behind until read
+        self._synced_at = time.monotonic() if len(entries) < self.READ_COUNT else None
+        return True
+
+    def _follow_forever(self):
+        while True:
+            if not self.follow_once(block=1000):
+                time.sleep(1)
+
+
+class FilteredBlocklist:
+    """Bloom filter in front of a blocklist backend.
+
+    The filter holds every revoked jti: revocations from this process are added
+    directly, and the ones from other workers arrive through the backend's
+    `subscribe`. It is rebuilt from the backend every `rebuild_interval`
+    seconds, which drops expired tokens, and whenever the backend may have
+    missed revocations. While the backend is not `in_sync` the filter may lack
+    recent revocations, so every lookup goes to the backend.
+    """
+
+    def __init__(self, blocklist, capacity=100_000, error_rate=0.001, rebuild_interval=300):
+        self.blocklist = blocklist
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.stats = Counter()
+        self._rebuilding = None
+        # Filters are written from request, stream and rebuild threads
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+
+        self.filter = BloomFilter(capacity, error_rate)
+        blocklist.subscribe(self._add_to_filter, self.rebuild)
+        self.rebuild()
+
+        if rebuild_interval:
+            thread = threading.Thread(
+                target=self._rebuild_forever, args=(rebuild_interval,), daemon=True
+            )
+            thread.start()
+
+    def _add_to_filter(self, jti):
+        with self._lock:
+            self.filter.add(jti)
+            if self._rebuilding is not None:
+                self._rebuilding.add(jti)
+
+    def rebuild(self):
+        with self._rebuild_lock:
+            fresh = BloomFilter(self.capacity, self.error_rate)
+            # Revocations arriving while we scan go into both filters
+            with self._lock:
+                self._rebuilding = fresh
+            try:
+                for jti in self.blocklist.revoked():
+                    with self._lock:
+                        fresh.add(jti)
+                with self._lock:
+                    self.filter = fresh
+            finally:
+                with self._lock:
+                    self._rebuilding = None
+
+    def _rebuild_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.rebuild()
+            except Exception:
+                logger.exception("Could not rebuild the blocklist filter, retrying.")
+
+    def add(self, jti, expires_at):
+        self._add_to_filter(jti)
+        self.blocklist.add(jti, expires_at)
+
+    def __contains__(self, jti):
+        if not self.blocklist.in_sync:
+            self.stats["unsynced"] += 1
+            return jti in self.blocklist
+
+        if jti not in self.filter:
+            self.stats["filtered"] += 1
+            return False
+
+        revoked = jti in self.blocklist
+        self.stats["revoked" if revoked else "false_positive"] += 1
+        return revoked
+
+    @property
+    def metrics(self):
+        not_revoked = self.stats["filtered"] + self.stats["false_positive"]
+        return {
+            "lookups_filtered": self.stats["filtered"],
+            "lookups_revoked": self.stats["revoked"],
+            "lookups_false_positive": self.stats["false_positive"],
+            "lookups_unsynced": self.stats["unsynced"],
+            "observed_false_positive_rate": (
+                self.stats["false_positive"] / not_revoked if not_revoked else 0.0
+            ),
+            "expected_false_positive_rate": self.filter.false_positive_rate,
+            "filter_items": self.filter.item_count,
+            "filter_bytes": self.filter.size_bytes,
+        }
+
+
+def get_blocklist():
+    """Return the blocklist of the current app, creating it on first use."""
+    blocklist = current_app.extensions.get("blocklist")
+    if blocklist is None:
+        backend = current_app.config.get("JWT_BLOCKLIST_BACKEND", "redis")
+        if backend == "redis":
+            blocklist = RedisBlocklist(redis.from_url(REDIS_URL))
+        elif backend == "memory":
+            blocklist = InMemoryBlocklist()
+        else:
+            raise ValueError(f"Unknown JWT_BLOCKLIST_BACKEND {backend!r}.")
+
+        if current_app.config.get("JWT_BLOCKLIST_FILTER", True):
+            blocklist = FilteredBlocklist(
+                blocklist,
+                capacity=current_app.config.get("JWT_BLOCKLIST_FILTER_CAPACITY", 100_000),
+                rebuild_interval=current_app.config.get(
+                    "JWT_BLOCKLIST_FILTER_REBUILD_INTERVAL", 300
+                ),
+            )
+        blocklist = current_app.extensions.setdefault("blocklist", blocklist)
+    return blocklist
+
+
+def _token_versions():
+    cache = current_app.extensions.get("token_versions")
+    if cache is None:
+        cache = TTLCache(current_app.config.get("JWT_TOKEN_VERSION_CACHE_TTL", 10))
+        cache = current_app.extensions.setdefault("token_versions", cache)
+    return cache
+
+
+def token_version(user_id):
+    """Current token version of a user, or `None` if the user does not exist."""
+    cache = _token_versions()
+    version, found = cache.get(user_id)
+    if not found:
+        version = (
+            db.session.query(UserModel.token_version)
+            .filter(UserModel.id == user_id)
+            .scalar()
+        )
+        cache.set(user_id, version)
+    return version
+
+
+def is_token_version_current(jwt_payload):
+    # Tokens issued before versioning count as version 0
+    return jwt_payload.get("token_version", 0) == token_version(int(jwt_payload["sub"]))
+
+
+def revoke_all_tokens(user_id):
+    """Revoke every token issued to a user so far. The caller commits."""
+    UserModel.query.filter(UserModel.id == user_id).update(
+        {UserModel.token_version: UserModel.token_version + 1}
+    )
+    _token_versions().delete(user_id)
+
 
-BLOCKLIST = set()
\ No newline at end of file
+def forget_token_version(user_id):
+    _token_versions().delete(user_id)
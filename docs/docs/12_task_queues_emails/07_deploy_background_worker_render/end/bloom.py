@@ -0,0 +1,45 @@
+"""
+bloom.py
+
+A small Bloom filter: a fixed-size bit array answering "definitely not in the
+set" or "possibly in the set". It never gives false negatives, and gives false
+positives at about `error_rate` once `capacity` items have been added.
+"""
+import hashlib
+import math
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bit_count = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+        self.item_count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bit_count for i in range(self.hash_count))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position // 8] |= 1 << (position % 8)
+        self.item_count += 1
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(key)
+        )
+
+    @property
+    def size_bytes(self):
+        return len(self.bits)
+
+    @property
+    def false_positive_rate(self):
+        """Expected false positive rate for the items added so far."""
+        return (1 - math.exp(-self.hash_count * self.item_count / self.bit_count)) ** self.hash_count
@@ -0,0 +1,276 @@
+"""
+cache.py
+
+Server-side cache for read endpoints, with invalidation driven by the writes.
+
+Each cached view names the resource its payload shows, e.g. `"item:{item_id}"`.
+All variants of that payload (the parsed `fields` and `expand` arguments, and
+the negotiated mimetype) are stored under that resource key, so a write can
+drop every one of them with `invalidate(key)`. An entry built while its key
+was invalidated is not stored, as it may show the data from before the write.
+The `keys_showing_*` helpers list the resource keys whose payload shows a given
+item, store or tag, which is what the write paths in `resources/` invalidate.
+
+Two backends are available, chosen with `RESPONSE_CACHE_BACKEND`:
+
+- `lru`: per-process, bounded by `RESPONSE_CACHE_MAX_ENTRIES`. Invalidation
+  only reaches the process doing the write, so only use it with one worker.
+- `redis`: shared by all workers, using `REDIS_URL` from settings.py.
+
+TTLs are set per endpoint in `RESPONSE_CACHE_TTL`, falling back to
+`RESPONSE_CACHE_DEFAULT_TTL` (in seconds).
+"""
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import wraps
+
+import marshmallow as ma
+import redis
+from flask import Response, current_app, request
+
+from settings import REDIS_URL
+
+
+class LRUBackend:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Generation of each resource key, bumped by `delete`. Bounded like the
+        # entries: evicted keys report the highest generation evicted so far.
+        self._generations = OrderedDict()
+        self._evicted_generation = 0
+        self._counter = 0
+
+    def _generation(self, key):
+        return self._generations.get(key, self._evicted_generation)
+
+    def generation(self, key):
+        with self._lock:
+            return self._generation(key)
+
+    def get(self, key, variant):
+        with self._lock:
+            variants = self._entries.get(key)
+            if variants is None:
+                return None
+            self._entries.move_to_end(key)
+            return variants.get(variant)
+
+    def set(self, key, variant, entry, generation):
+        with self._lock:
+            if self._generation(key) != generation:
+                # Invalidated while the entry was being built, it may be stale
+                return
+            self._entries.setdefault(key, {})[variant] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._counter += 1
+                self._generations[key] = self._counter
+                self._generations.move_to_end(key)
+            while len(self._generations) > self.max_entries:
+                _, evicted = self._generations.popitem(last=False)
+                self._evicted_generation = max(self._evicted_generation, evicted)
+
+
+class RedisBackend:
+    """Stores each resource as a Redis hash of variant -> entry.
+
+    A counter per resource, incremented by `delete`, tells whether an entry
+    was invalidated while it was being built.
+    """
+
+    GENERATION_TTL = 24 * 3600
+
+    def __init__(self, url, prefix="response-cache:"):
+        self.connection = redis.from_url(url)
+        self.prefix = prefix
+
+    def _generation_key(self, key):
+        return f"{self.prefix}generation:{key}"
+
+    def generation(self, key):
+        return int(self.connection.get(self._generation_key(key)) or 0)
+
+    def get(self, key, variant):
+        value = self.connection.hget(self.prefix + key, variant)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, variant, entry, generation):
+        generation_key = self._generation_key(key)
+
+        def fill(pipe):
+            if int(pipe.get(generation_key) or 0) != generation:
+                # Invalidated while the entry was being built, it may be stale
+                return
+            pipe.multi()
+            pipe.hset(self.prefix + key, variant, json.dumps(entry))
+            # Entries check their own expiry, this only reclaims abandoned keys
+            pipe.expire(self.prefix + key, max(0, int(entry["expires"] - time.time())) + 1)
+
+        # Retried if the generation changes between the check and the write
+        self.connection.transaction(fill, generation_key)
+
+    def delete(self, *keys):
+        if keys:
+            pipe = self.connection.pipeline()
+            pipe.delete(*(self.prefix + key for key in keys))
+            for key in keys:
+                pipe.incr(self._generation_key(key))
+                pipe.expire(self._generation_key(key), self.GENERATION_TTL)
+            pipe.execute()
+
+
+class TTLCache:
+    """Bounded per-process cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl=10, max_entries=10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return `(value, found)`, so cached `None` values can be told apart."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                return None, False
+            self._entries.move_to_end(key)
+            return entry[0], True
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def keys_showing_item(item):
+    keys = [f"item:{item.id}", f"store:{item.store_id}"]
+    for tag in item.tags:
+        keys += [f"tag:{tag.id}", f"store_tags:{tag.store_id}"]
+    return keys
+
+
+def keys_showing_tag(tag):
+    keys = [f"tag:{tag.id}", f"store:{tag.store_id}", f"store_tags:{tag.store_id}"]
+    keys += [f"item:{item.id}" for item in tag.items]
+    return keys
+
+
+def _variant(args_schema):
+    """Variant of the request's payload, `None` if its arguments are invalid."""
+    try:
+        fieldset = args_schema().load(request.args)
+    except ma.ValidationError:
+        return None
+    mimetype = request.accept_mimetypes.best_match(["application/json"])
+    return f"{','.join(sorted(fieldset.fields))}|{','.join(sorted(fieldset.expand))}|{mimetype}"
+
+
+class ResponseCache:
+    CACHED_HEADERS = ["Content-Type", "ETag", "Last-Modified"]
+
+    def init_app(self, app):
+        app.config.setdefault("RESPONSE_CACHE_BACKEND", "lru")
+        app.config.setdefault("RESPONSE_CACHE_MAX_ENTRIES", 1024)
+        app.config.setdefault("RESPONSE_CACHE_DEFAULT_TTL", 60)
+        app.config.setdefault("RESPONSE_CACHE_TTL", {})
+
+        backend_name = app.config["RESPONSE_CACHE_BACKEND"]
+        if backend_name == "lru":
+            backend = LRUBackend(app.config["RESPONSE_CACHE_MAX_ENTRIES"])
+        elif backend_name == "redis":
+            backend = RedisBackend(REDIS_URL)
+        elif backend_name == "none":
+            backend = None
+        else:
+            raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND {backend_name!r}.")
+
+        app.extensions["response_cache"] = {"backend": backend, "stats": Counter()}
+
+    @property
+    def _state(self):
+        return current_app.extensions["response_cache"]
+
+    @property
+    def stats(self):
+        """Hit and miss counts of this process, keyed by `(endpoint, "hit"|"miss")`."""
+        return self._state["stats"]
+
+    def cached(self, key_template, args_schema):
+        """Decorator caching successful responses of a GET view.
+
+        :param key_template: Resource key of the payload, formatted with the
+            URL arguments of the view, e.g. `"item:{item_id}"`.
+        :param args_schema: Fieldset arguments schema of the view (see
+            `fieldsets.fieldset_args`). Entries are stored per parsed fieldset,
+            so unknown arguments and their order don't add entries.
+        """
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                backend = self._state["backend"]
+                variant = _variant(args_schema)
+                if backend is None or variant is None:
+                    return func(*args, **kwargs)
+
+                key = key_template.format(**request.view_args)
+                entry = backend.get(key, variant)
+                if entry is not None and entry["expires"] > time.time():
+                    self.stats[request.endpoint, "hit"] += 1
+                    resp = Response(entry["body"], headers=entry["headers"])
+                    resp.headers["X-Cache"] = "HIT"
+                    return resp.make_conditional(request)
+
+                self.stats[request.endpoint, "miss"] += 1
+                generation = backend.generation(key)
+                resp = func(*args, **kwargs)
+                if resp.status_code == 200 and not resp.is_streamed:
+                    self._fill(backend, key, variant, resp, generation)
+                resp.headers["X-Cache"] = "MISS"
+                return resp
+
+            return wrapper
+
+        return decorator
+
+    def _fill(self, backend, key, variant, resp, generation):
+        ttl = current_app.config["RESPONSE_CACHE_TTL"].get(
+            request.endpoint, current_app.config["RESPONSE_CACHE_DEFAULT_TTL"]
+        )
+        entry = {
+            "body": resp.get_data(as_text=True),
+            "headers": {
+                name: resp.headers[name] for name in self.CACHED_HEADERS if name in resp.headers
+            },
+            "expires": time.time() + ttl,
+        }
+        backend.set(key, variant, entry, generation)
+
+    @property
+    def enabled(self):
+        return self._state["backend"] is not None
+
+    def invalidate(self, *keys):
+        backend = self._state["backend"]
+        if backend is not None:
+            backend.delete(*set(keys))
+
+
+response_cache = ResponseCache()
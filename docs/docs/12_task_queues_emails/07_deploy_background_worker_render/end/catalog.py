@@ -0,0 +1,219 @@
+"""
+catalog.py
+
+Export and import of the whole catalog (stores, tags, items and the links
+between items and tags), as NDJSON or CSV. Used to rebuild an environment from
+another one, through `GET /export` / `POST /import` or `flask catalog`.
+
+Every record has a `type` (store, tag, item or link) and the columns of that
+table; CSV files have one column per field, left empty where a type doesn't
+have it. Parents are exported before their children, and imports expect the
+same order.
+
+Exports read each table with a server-side cursor, `CHUNK_SIZE` rows at a
+time. Imports parse the input line by line and insert `batch_size` rows per
+transaction, with COPY on PostgreSQL. Ids are kept, so import into an empty
+database. Every store a batch adds rows to gets a new `updated_at` and its
+cached responses dropped, so conditional and cached GETs see the import.
+
+The COPY path is tested against a real database only when `TEST_POSTGRES_URL`
+is set, e.g. `postgresql://postgres@localhost/test` (its tables are dropped).
+"""
+import csv
+import io
+import json
+from collections import Counter
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert, select, text, update
+
+from cache import response_cache
+from db import db
+from models import ItemModel, ItemTags, StoreModel, TagModel
+from models.timestamp import utcnow
+from streaming import CHUNK_SIZE, NDJSON_MIMETYPE
+
+# In dependency order
+RECORD_TYPES = {
+    "store": (StoreModel, ["id", "name"]),
+    "tag": (TagModel, ["id", "name", "store_id"]),
+    "item": (ItemModel, ["id", "name", "description", "price", "store_id"]),
+    "link": (ItemTags, ["item_id", "tag_id"]),
+}
+CSV_FIELDS = ["type", "id", "name", "description", "price", "store_id", "item_id", "tag_id"]
+CSV_TYPES = {"id": int, "store_id": int, "item_id": int, "tag_id": int, "price": float}
+MIMETYPES = {"ndjson": NDJSON_MIMETYPE, "csv": "text/csv"}
+
+
+class CatalogFormatError(ValueError):
+    pass
+
+
+def export_records(chunk_size=CHUNK_SIZE):
+    for record_type, (model, columns) in RECORD_TYPES.items():
+        statement = (
+            select(*(getattr(model, column) for column in columns))
+            .order_by(model.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        for row in db.session.execute(statement).mappings():
+            yield {"type": record_type, **row}
+
+
+def write_ndjson(records, chunk_size=CHUNK_SIZE):
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record))
+        if len(lines) == chunk_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def write_csv(records, chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CSV_FIELDS)
+    writer.writeheader()
+    for count, record in enumerate(records, start=1):
+        writer.writerow(record)
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def read_ndjson(lines):
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            raise CatalogFormatError(f"Line {line_number}: invalid JSON ({e.msg}).")
+
+
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    for record in reader:
+        try:
+            yield reader.line_num, {
+                field: CSV_TYPES.get(field, str)(value) if value != "" else None
+                for field, value in record.items()
+            }
+        except (TypeError, ValueError):
+            raise CatalogFormatError(f"Line {reader.line_num}: invalid value.")
+
+
+READERS = {"ndjson": read_ndjson, "csv": read_csv}
+WRITERS = {"ndjson": write_ndjson, "csv": write_csv}
+
+
+def _copy_rows(model, columns, rows):
+    """Load rows with COPY, much faster than INSERT on PostgreSQL."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([row[column] for column in columns] for row in rows)
+    buffer.seek(0)
+    cursor = db.session.connection().connection.dbapi_connection.cursor()
+    cursor.copy_expert(
+        f"COPY {model.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+
+
+def _insert_rows(model, columns, rows):
+    if db.session.get_bind().dialect.name == "postgresql":
+        _copy_rows(model, columns, rows)
+    else:
+        db.session.execute(insert(model), rows)
+
+
+def import_records(records, batch_size=1000, on_batch=None):
+    """Insert `(line_number, record)` pairs. Returns the count per type.
+
+    `on_batch` is called with the counts so far after each committed batch.
+    """
+    counts = Counter()
+    batches = {record_type: [] for record_type in RECORD_TYPES}
+
+    def flush():
+        store_ids = {row["id"] for row in batches["store"]}
+        store_ids |= {row["store_id"] for row in batches["tag"] + batches["item"]}
+        store_ids.discard(None)
+
+        # Parents first, so a batch never refers to rows not inserted yet
+        for record_type, rows in batches.items():
+            if rows:
+                model, columns = RECORD_TYPES[record_type]
+                _insert_rows(model, columns, rows)
+                counts[record_type] += len(rows)
+                rows.clear()
+        if store_ids:
+            db.session.execute(
+                update(StoreModel)
+                .where(StoreModel.id.in_(store_ids))
+                .values(updated_at=utcnow())
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+        response_cache.invalidate(
+            *(f"{resource}:{store_id}" for store_id in store_ids for resource in ("store", "store_tags"))
+        )
+        if on_batch is not None:
+            on_batch(counts)
+
+    pending = 0
+    for line_number, record in records:
+        record_type = record.get("type") if isinstance(record, dict) else None
+        if record_type not in RECORD_TYPES:
+            raise CatalogFormatError(f"Line {line_number}: unknown record type {record_type!r}.")
+        _, columns = RECORD_TYPES[record_type]
+        batches[record_type].append({column: record.get(column) for column in columns})
+        pending += 1
+        if pending == batch_size:
+            flush()
+            pending = 0
+    flush()
+
+    if db.session.get_bind().dialect.name == "postgresql":
+        # Rows were inserted with their ids, move the sequences past them
+        for model, _ in RECORD_TYPES.values():
+            table = model.__tablename__
+            db.session.execute(
+                text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"COALESCE(MAX(id), 0) + 1, false) FROM {table}"
+                )
+            )
+        db.session.commit()
+
+    return counts
+
+
+@click.group("catalog")
+def catalog_cli():
+    """Export and import the whole catalog."""
+
+
+@catalog_cli.command("export")
+@click.option("--format", "file_format", type=click.Choice(list(WRITERS)), default="ndjson")
+@click.option("--output", type=click.File("w"), default="-")
+@with_appcontext
+def export_command(file_format, output):
+    for chunk in WRITERS[file_format](export_records()):
+        output.write(chunk)
+
+
+@catalog_cli.command("import")
+@click.argument("source", type=click.File("r"))
+@click.option("--format", "file_format", type=click.Choice(list(READERS)), default="ndjson")
+@click.option("--batch-size", default=1000, show_default=True)
+@with_appcontext
+def import_command(source, file_format, batch_size):
+    try:
+        counts = import_records(READERS[file_format](source), batch_size)
+    except CatalogFormatError as e:
+        raise click.ClickException(str(e))
+    click.echo(", ".join(f"{counts[record_type]} {record_type}s" for record_type in RECORD_TYPES))
@@ -0,0 +1,69 @@
+"""
+claims.py
+
+Claims added to every JWT when it is issued, resolved from the user's roles.
+
+Tokens are issued on every login and refresh, so the claims are cached per
+process for `JWT_CLAIMS_CACHE_TTL` seconds. Changing a user's roles through
+`set_user_roles` drops the entry in this process; other workers pick the
+change up once their entry expires. Tokens already issued keep their claims
+until they expire.
+
+Use `flask grant-role USERNAME admin` to create the first admin.
+"""
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from cache import TTLCache
+from db import db
+from models import RoleModel, UserModel, UserRoles
+
+
+def _claims_cache():
+    cache = current_app.extensions.get("user_claims")
+    if cache is None:
+        cache = TTLCache(current_app.config.get("JWT_CLAIMS_CACHE_TTL", 60))
+        cache = current_app.extensions.setdefault("user_claims", cache)
+    return cache
+
+
+def user_claims(user_id):
+    cache = _claims_cache()
+    claims, found = cache.get(user_id)
+    if not found:
+        roles = sorted(
+            name
+            for (name,) in db.session.query(RoleModel.name)
+            .join(UserRoles, UserRoles.role_id == RoleModel.id)
+            .filter(UserRoles.user_id == user_id)
+        )
+        claims = {"roles": roles, "is_admin": "admin" in roles}
+        cache.set(user_id, claims)
+    # flask-jwt-extended adds `additional_claims` to the dict it gets, which
+    # mustn't leak into the next token of this user
+    return {**claims, "roles": list(claims["roles"])}
+
+
+def set_user_roles(user, roles):
+    """Replace the roles of a user. The caller commits."""
+    user.roles = roles
+    _claims_cache().delete(user.id)
+
+
+@click.command("grant-role")
+@click.argument("username")
+@click.argument("role")
+@with_appcontext
+def grant_role(username, role):
+    """Give a role to a user, e.g. the first admin."""
+    user = UserModel.query.filter(UserModel.username == username).first()
+    if user is None:
+        raise click.ClickException(f"No user named {username!r}.")
+    role_model = RoleModel.query.filter(RoleModel.name == role).first()
+    if role_model is None:
+        raise click.ClickException(f"No role named {role!r}.")
+
+    set_user_roles(user, list({*user.roles, role_model}))
+    db.session.commit()
+    click.echo(f"{username} now has the roles: {', '.join(r.name for r in user.roles)}.")
@@ -0,0 +1,85 @@
+"""
+conditional.py
+
+Conditional GET support (ETag / Last-Modified) for read endpoints.
+
+Each endpoint provides a version function that runs one cheap query returning
+the latest `updated_at` of every row its representation depends on. The ETag is
+computed from that version and the query arguments (which select the
+representation), so `If-None-Match` and `If-Modified-Since` can be answered
+with a 304 before any relationship is loaded or any schema is dumped.
+"""
+from datetime import timezone
+from functools import wraps
+
+from flask import request
+from flask_smorest.exceptions import NotModified
+from sqlalchemy import func
+
+from db import db
+from models import ItemModel, StoreModel, TagModel
+
+
+def latest(*timestamps):
+    """Most recent of the given timestamps, ignoring missing ones."""
+    return max((ts for ts in timestamps if ts is not None), default=None)
+
+
+def catalog_version(model):
+    """Version of a whole collection of `model`.
+
+    Items, stores and tags are all nested in each other's representations, so
+    any change to one of them changes the collection. The row count catches
+    deletions that leave no newer timestamp behind.
+    """
+    row = db.session.query(
+        db.session.query(func.max(ItemModel.updated_at)).scalar_subquery(),
+        db.session.query(func.max(StoreModel.updated_at)).scalar_subquery(),
+        db.session.query(func.max(TagModel.updated_at)).scalar_subquery(),
+        db.session.query(func.count(model.id)).scalar_subquery(),
+    ).one()
+    return latest(*row[:3]), row[3]
+
+
+def conditional(blp, get_version, last_modified=True):
+    """Decorator answering conditional GETs for a view.
+
+    :param blp: Blueprint of the view, used for its ETag handling.
+    :param get_version: Called with the URL arguments of the view. Returns
+        `None` if the resource does not exist (the view then returns the 404),
+        or a tuple whose first element is the latest `updated_at`.
+    :param last_modified: Whether to send `Last-Modified` and honour
+        `If-Modified-Since`. Collections should disable it, as deleting a row
+        does not make any remaining timestamp newer.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            version = get_version(**request.view_args)
+            if version is None:
+                return func(*args, **kwargs)
+
+            modified = version[0].replace(tzinfo=timezone.utc) if version[0] else None
+            if last_modified and modified and not request.if_none_match:
+                since = request.if_modified_since
+                if since and modified.replace(microsecond=0) <= since:
+                    raise NotModified
+
+            # Raises NotModified if the client already has this ETag
+            blp.set_etag(
+                {
+                    "version": [str(part) for part in version],
+                    "args": sorted(request.args.items(multi=True)),
+                    "accept": request.accept_mimetypes.best,
+                }
+            )
+
+            resp = func(*args, **kwargs)
+            if last_modified and modified:
+                resp.last_modified = modified
+            return resp
+
+        return blp.etag(wrapper)
+
+    return decorator
@@ -0,0 +1,202 @@
+import time
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app import create_app
+from blocklist import token_version
+from db import db
+from models import UserModel
+
+
+@pytest.fixture()
+def app():
+    app = create_app("sqlite://")
+    app.config.update(
+        {
+            "TESTING": True,
+            "JWT_BLOCKLIST_BACKEND": "memory",
+            "IDEMPOTENCY_BACKEND": "memory",
+        }
+    )
+
+    # The app relies on migrations to create tables, so do it here instead
+    with app.app_context():
+        db.create_all()
+
+    yield app
+
+
+@pytest.fixture()
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture()
+def count_queries(app):
+    """Context manager collecting every SQL statement run inside it."""
+    with app.app_context():
+        engine = db.engine
+
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return counter
+
+
+@pytest.fixture()
+def user_id(app):
+    with app.app_context():
+        user = UserModel(username="test", email="test@example.com", password="x")
+        db.session.add(user)
+        db.session.commit()
+        # Cache the token version so query counts only see the view's queries
+        token_version(user.id)
+        return user.id
+
+
+@pytest.fixture()
+def fresh_jwt(app, user_id):
+    with app.app_context():
+        access_token = create_access_token(identity=user_id, fresh=True)
+        return access_token
+
+
+@pytest.fixture()
+def jwt(app, user_id):
+    with app.app_context():
+        access_token = create_access_token(identity=user_id)
+        return access_token
+
+
+@pytest.fixture()
+def admin_jwt(app, user_id):
+    with app.app_context():
+        access_token = create_access_token(
+            identity=user_id, additional_claims={"is_admin": True}
+        )
+        return access_token
+
+
+class FakeRedis:
+    """The Redis commands the app uses, on dicts, for tests without a server."""
+
+    def __init__(self):
+        self.values = {}
+        self.expiry = {}
+        self.streams = {}
+
+    def _live(self, key):
+        if key in self.expiry and self.expiry[key] <= time.time():
+            self.delete(key)
+        return key in self.values
+
+    def get(self, key):
+        return self.values[key] if self._live(key) else None
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and self._live(key):
+            return None
+        self.values[key] = value if isinstance(value, bytes) else str(value).encode()
+        self.expiry.pop(key, None)
+        if ex is not None:
+            self.expiry[key] = time.time() + ex
+        return True
+
+    def exists(self, *keys):
+        return sum(self._live(key) for key in keys)
+
+    def append(self, key, value):
+        self.values[key] = (self.get(key) or b"") + value
+        return len(self.values[key])
+
+    def getrange(self, key, start, end):
+        return (self.get(key) or b"")[start : end + 1]
+
+    def expire(self, key, seconds):
+        if self._live(key):
+            self.expiry[key] = time.time() + seconds
+
+    def ttl(self, key):
+        if not self._live(key):
+            return -2
+        return round(self.expiry[key] - time.time()) if key in self.expiry else -1
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+            self.expiry.pop(key, None)
+
+    def scan_iter(self, match="*", count=None):
+        for key in list(self.values):
+            if self._live(key) and fnmatchcase(key, match):
+                yield key.encode()
+
+    @staticmethod
+    def _stream_id(entry_id):
+        if isinstance(entry_id, bytes):
+            entry_id = entry_id.decode()
+        return tuple(int(part) for part in entry_id.split("-"))
+
+    def xadd(self, name, fields, maxlen=None, approximate=True):
+        entries = self.streams.setdefault(name, [])
+        sequence = self._stream_id(entries[-1][0])[0] + 1 if entries else 1
+        entry_id = f"{sequence}-0".encode()
+        fields = {key.encode(): value.encode() for key, value in fields.items()}
+        entries.append((entry_id, fields))
+        if maxlen is not None:
+            del entries[:-maxlen]
+        return entry_id
+
+    def xrevrange(self, name, max="+", min="-", count=None):
+        return self.streams.get(name, [])[::-1][:count]
+
+    def xread(self, streams, count=None, block=None):
+        response = []
+        for name, last_id in streams.items():
+            last_id = self._stream_id(last_id)
+            entries = [
+                entry
+                for entry in self.streams.get(name, [])
+                if self._stream_id(entry[0]) > last_id
+            ][:count]
+            if entries:
+                response.append([name.encode(), entries])
+        if not response and block:
+            # Nothing arrives while the caller waits: there is no other client
+            time.sleep(block / 1000)
+        return response
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, connection):
+        self.connection = connection
+        self.commands = []
+
+    def __getattr__(self, name):
+        command = getattr(self.connection, name)
+        return lambda *args, **kwargs: self.commands.append((command, args, kwargs))
+
+    def execute(self):
+        return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+@pytest.fixture()
+def fake_redis():
+    return FakeRedis()
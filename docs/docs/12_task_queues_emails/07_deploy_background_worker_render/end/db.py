@@ -1,3 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql, sqlite
 
 db = SQLAlchemy()
+
+# INSERT ... ON CONFLICT is dialect specific
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def upsert_insert(model):
+    """An INSERT supporting `on_conflict_do_*` for the current database."""
+    return UPSERT_INSERTS[db.session.get_bind().dialect.name](model)
@@ -0,0 +1,104 @@
+"""
+fieldsets.py
+
+Sparse fieldsets and opt-in expansion for read endpoints.
+
+Clients can ask for `?fields=id,name,price` to get only some of the plain fields
+of a schema, and `?expand=store,tags` to get nested relationships. When neither
+argument is passed, the full schema is returned, as before.
+
+The same choice is used to build the ORM query: only the selected columns are
+loaded (everything else, e.g. `ItemModel.description`, is deferred), and only
+the expanded relationships get a loader, so the rest are never queried.
+"""
+import marshmallow as ma
+from flask import jsonify
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+from webargs.fields import DelimitedList
+
+
+def _is_nested(field):
+    if isinstance(field, ma.fields.List):
+        field = field.inner
+    return isinstance(field, ma.fields.Nested)
+
+
+def _split_fields(schema_class):
+    """Split the dumped fields of a schema into plain fields and relationships."""
+    dump_fields = schema_class().dump_fields
+    relationships = [name for name, field in dump_fields.items() if _is_nested(field)]
+    columns = [name for name in dump_fields if name not in relationships]
+    return columns, relationships
+
+
+class Fieldset:
+    """The fields and relationships of `schema_class` requested by the client.
+
+    :param schema_class: Marshmallow schema used for the full representation.
+    :param model: Model the schema serializes.
+    :param loaders: Mapping of relationship field name to the loader option
+        (e.g. `selectinload(...)`) used when that relationship is expanded.
+    """
+
+    def __init__(self, schema_class, model, loaders, fields=None, expand=None):
+        columns, relationships = _split_fields(schema_class)
+
+        if fields is None and expand is None:
+            expand = relationships
+
+        self.schema_class = schema_class
+        self.model = model
+        self.loaders = loaders
+        self.fields = list(fields or columns)
+        self.expand = list(expand or [])
+
+    def query_options(self):
+        """Loader options that load exactly what `response` dumps."""
+        column_keys = inspect(self.model).column_attrs.keys()
+        columns = [getattr(self.model, name) for name in self.fields if name in column_keys]
+        return [load_only(*columns), *(self.loaders[name] for name in self.expand)]
+
+    def schema(self, many=False):
+        return self.schema_class(only=(*self.fields, *self.expand), many=many)
+
+    def response(self, obj, many=False):
+        return jsonify(self.schema(many=many).dump(obj))
+
+
+def fieldset_args(schema_class, model, loaders):
+    """Build the query arguments schema for `schema_class`.
+
+    Once parsed with `@blp.arguments(..., location="query")`, the view receives
+    a `Fieldset`.
+    """
+    columns, relationships = _split_fields(schema_class)
+
+    class FieldsetArgsSchema(ma.Schema):
+        class Meta:
+            ordered = True
+            unknown = ma.EXCLUDE
+
+        selected_fields = DelimitedList(
+            ma.fields.String(validate=ma.validate.OneOf(columns)),
+            data_key="fields",
+            metadata={"description": f"Comma-separated subset of: {', '.join(columns)}."},
+        )
+        expand = DelimitedList(
+            ma.fields.String(validate=ma.validate.OneOf(relationships)),
+            metadata={
+                "description": f"Comma-separated relationships to include: {', '.join(relationships)}."
+            },
+        )
+
+        @ma.post_load
+        def make_fieldset(self, data, **kwargs):
+            return Fieldset(
+                schema_class,
+                model,
+                loaders,
+                fields=data.get("selected_fields"),
+                expand=data.get("expand"),
+            )
+
+    return FieldsetArgsSchema
@@ -0,0 +1,185 @@
+"""
+idempotency.py
+
+`Idempotency-Key` support for POST endpoints, so clients can retry safely.
+
+The first request with a given key runs the view and its response (status,
+body and a few headers) is stored for `IDEMPOTENCY_TTL` seconds. Retries with
+the same key get the stored response back, with an `Idempotent-Replayed: true`
+header, without the view running again. A retry arriving while the first
+request is still running waits up to `IDEMPOTENCY_WAIT` seconds for it, then
+gets a 409. Reusing a key for a different request body is a 422.
+
+Keys are scoped to the endpoint and the identity of the verified JWT, so
+users can't see each other's responses, and a retry made with a refreshed
+token still matches. Views without `jwt_required` share one anonymous scope. Server errors (5xx) and aborted requests
+are not stored, so a retry runs the view again.
+
+Like the JWT blocklist, the store is Redis (`IDEMPOTENCY_BACKEND=redis`, shared
+by all workers) or a per-process dict (`memory`, for tests).
+"""
+import hashlib
+import json
+import threading
+import time
+from functools import wraps
+
+import redis
+from flask import Response, current_app, request
+from flask_jwt_extended import get_jwt_identity
+from flask_smorest import abort
+
+from settings import REDIS_URL
+
+IN_FLIGHT = "in_flight"
+DONE = "done"
+STORED_HEADERS = ["Content-Type", "Location"]
+
+
+class InMemoryIdempotencyStore:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= time.time():
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return None if entry is None else entry[0]
+
+    def claim(self, key, record, ttl):
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._entries[key] = (record, time.time() + ttl)
+            return True
+
+    def set(self, key, record, ttl):
+        with self._lock:
+            self._entries[key] = (record, time.time() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisIdempotencyStore:
+    def __init__(self, connection, prefix="idempotency:"):
+        self.connection = connection
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.connection.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    def claim(self, key, record, ttl):
+        return bool(self.connection.set(self.prefix + key, json.dumps(record), nx=True, ex=ttl))
+
+    def set(self, key, record, ttl):
+        self.connection.set(self.prefix + key, json.dumps(record), ex=ttl)
+
+    def delete(self, key):
+        self.connection.delete(self.prefix + key)
+
+
+def get_idempotency_store():
+    store = current_app.extensions.get("idempotency")
+    if store is None:
+        backend = current_app.config.get("IDEMPOTENCY_BACKEND", "redis")
+        if backend == "redis":
+            store = RedisIdempotencyStore(redis.from_url(REDIS_URL))
+        elif backend == "memory":
+            store = InMemoryIdempotencyStore()
+        else:
+            raise ValueError(f"Unknown IDEMPOTENCY_BACKEND {backend!r}.")
+        store = current_app.extensions.setdefault("idempotency", store)
+    return store
+
+
+def _replay(record):
+    resp = Response(record["body"], status=record["status"], headers=record["headers"])
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+
+def _caller():
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:
+        # The view doesn't verify JWTs
+        identity = None
+    return "anonymous" if identity is None else f"user:{identity}"
+
+
+def _stored_response(store, key, fingerprint):
+    """The response stored for a key someone else claimed, once it's done.
+
+    Returns `None` if the first request failed and released the key.
+    """
+    deadline = time.monotonic() + current_app.config["IDEMPOTENCY_WAIT"]
+    record = store.get(key)
+    while record is not None and record["state"] == IN_FLIGHT and time.monotonic() < deadline:
+        time.sleep(0.05)
+        record = store.get(key)
+
+    if record is None:
+        return None
+    if record["fingerprint"] != fingerprint:
+        abort(422, message="This Idempotency-Key was used for a different request.")
+    if record["state"] == IN_FLIGHT:
+        abort(409, message="A request with this Idempotency-Key is still in progress.")
+    return _replay(record)
+
+
+def idempotent(func):
+    """Decorator making a POST view honour the `Idempotency-Key` header.
+
+    Put it below `jwt_required` and above the argument and response decorators,
+    so replays skip validation and the view entirely.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        idempotency_key = request.headers.get("Idempotency-Key")
+        if not idempotency_key:
+            return func(*args, **kwargs)
+
+        config = current_app.config
+        store = get_idempotency_store()
+        key = f"{request.endpoint}:{request.path}:{_caller()}:{idempotency_key}"
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+        claimed = store.claim(
+            key, {"state": IN_FLIGHT, "fingerprint": fingerprint}, config["IDEMPOTENCY_LOCK_TIMEOUT"]
+        )
+        if not claimed:
+            resp = _stored_response(store, key, fingerprint)
+            # None when the first request failed and released the key: run this one
+            return wrapper(*args, **kwargs) if resp is None else resp
+
+        try:
+            resp = current_app.make_response(func(*args, **kwargs))
+        except BaseException:
+            store.delete(key)
+            raise
+
+        if resp.status_code >= 500 or resp.is_streamed:
+            store.delete(key)
+        else:
+            record = {
+                "state": DONE,
+                "fingerprint": fingerprint,
+                "status": resp.status_code,
+                "body": resp.get_data(as_text=True),
+                "headers": {name: resp.headers[name] for name in STORED_HEADERS if name in resp.headers},
+            }
+            store.set(key, record, config["IDEMPOTENCY_TTL"])
+        return resp
+
+    return wrapper
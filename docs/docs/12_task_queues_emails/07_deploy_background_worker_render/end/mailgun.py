@@ -0,0 +1,163 @@
+"""
+mailgun.py
+
+HTTP client for the Mailgun API, used by the worker to send emails.
+
+Each worker process keeps one `requests.Session`, so sends reuse pooled
+keep-alive connections instead of paying a TCP and TLS handshake per email.
+RQ's default worker forks a process per job, which throws the pool away after
+every email, so `worker-entrypoint.sh` runs RQ's non-forking `SimpleWorker`.
+
+Configured through environment variables:
+
+- `MAILGUN_API_URL`: base URL of the API. Point it at a local HTTP stand-in to
+  benchmark the pipeline without sending anything.
+- `MAILGUN_POOL_SIZE`: connections kept open to the API.
+- `MAILGUN_CONNECT_TIMEOUT` and `MAILGUN_READ_TIMEOUT`, in seconds.
+- `MAILGUN_RETRIES`: retries, with backoff, on connection errors and on 429
+  and 503 responses, waiting `MAILGUN_RETRY_BACKOFF` seconds and doubling.
+  Read timeouts and other errors aren't retried, as Mailgun may have accepted
+  the email already.
+
+Every send logs its latency, split into connecting (0 when a pooled connection
+was reused) and the request itself.
+"""
+import logging
+import os
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.retry import Retry
+
+load_dotenv()
+
+API_URL = os.getenv("MAILGUN_API_URL", "https://api.mailgun.net/v3").rstrip("/")
+POOL_SIZE = int(os.getenv("MAILGUN_POOL_SIZE", 10))
+CONNECT_TIMEOUT = float(os.getenv("MAILGUN_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.getenv("MAILGUN_READ_TIMEOUT", 10))
+RETRIES = int(os.getenv("MAILGUN_RETRIES", 3))
+RETRY_BACKOFF = float(os.getenv("MAILGUN_RETRY_BACKOFF", 0.5))
+# Only statuses meaning the email wasn't accepted. A 502 or 504 can come after
+# Mailgun took it, and retrying would send it twice.
+RETRY_STATUSES = [429, 503]
+
+# A child of RQ's worker logger, so it goes wherever the worker logs
+logger = logging.getLogger("rq.worker.mailgun")
+
+_timings = threading.local()
+_session = None
+_session_pid = None
+
+
+class _TimedConnectMixin:
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _timings.connect = getattr(_timings, "connect", 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """`HTTPAdapter` recording how long new connections take to open."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def _build_session():
+    retry = Retry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=0,
+        status=RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,
+        backoff_factor=RETRY_BACKOFF,
+        raise_on_status=False,
+    )
+    adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.auth = ("api", os.getenv("MAILGUN_API_KEY", ""))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session():
+    """The session of this process, built on first use.
+
+    A session inherited through a fork would share its sockets with the
+    parent, so each process builds its own.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        _session = _build_session()
+        _session_pid = os.getpid()
+    return _session
+
+
+def post(path, **kwargs):
+    """POST to `{MAILGUN_API_URL}/{path}`.
+
+    The response has a `timings` dict with the `connect` and `request` times,
+    in seconds.
+    """
+    _timings.connect = 0.0
+    start = time.perf_counter()
+    response = get_session().post(
+        f"{API_URL}/{path}", timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs
+    )
+    elapsed = time.perf_counter() - start
+
+    response.timings = {"connect": _timings.connect, "request": elapsed - _timings.connect}
+    logger.info(
+        "POST %s: %s in %.1f ms (connect %.1f ms, request %.1f ms)",
+        path,
+        response.status_code,
+        elapsed * 1000,
+        response.timings["connect"] * 1000,
+        response.timings["request"] * 1000,
+    )
+    return response
+
+
+def not_accepted(response):
+    """Whether Mailgun certainly didn't take the emails of this response."""
+    return 400 <= response.status_code < 500 or response.status_code in RETRY_STATUSES
+
+
+def not_sent(error):
+    """Whether a `requests` error happened before anything was sent.
+
+    Only failures to connect qualify: after a read timeout or a dropped
+    connection, Mailgun may have accepted the emails.
+    """
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.ConnectTimeout) or isinstance(reason, ConnectTimeoutError)
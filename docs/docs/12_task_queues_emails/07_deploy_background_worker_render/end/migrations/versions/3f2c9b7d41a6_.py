@@ -0,0 +1,47 @@
+"""empty message
+
+Revision ID: 3f2c9b7d41a6
+Revises: d8e0f80631fb
+Create Date: 2026-10-18 10:12:37.418203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3f2c9b7d41a6"
+down_revision = "d8e0f80631fb"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Batch mode so SQLite can add a NOT NULL column with a non-constant default
+    with op.batch_alter_table("items") as batch_op:
+        batch_op.add_column(
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False)
+        )
+        batch_op.create_index(batch_op.f("ix_items_updated_at"), ["updated_at"], unique=False)
+    with op.batch_alter_table("stores") as batch_op:
+        batch_op.add_column(
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False)
+        )
+        batch_op.create_index(batch_op.f("ix_stores_updated_at"), ["updated_at"], unique=False)
+    with op.batch_alter_table("tags") as batch_op:
+        batch_op.add_column(
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False)
+        )
+        batch_op.create_index(batch_op.f("ix_tags_updated_at"), ["updated_at"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("tags") as batch_op:
+        batch_op.drop_index(batch_op.f("ix_tags_updated_at"))
+        batch_op.drop_column("updated_at")
+    with op.batch_alter_table("stores") as batch_op:
+        batch_op.drop_index(batch_op.f("ix_stores_updated_at"))
+        batch_op.drop_column("updated_at")
+    with op.batch_alter_table("items") as batch_op:
+        batch_op.drop_index(batch_op.f("ix_items_updated_at"))
+        batch_op.drop_column("updated_at")
@@ -0,0 +1,28 @@
+"""empty message
+
+Revision ID: 5b1e7c2a9d40
+Revises: 3f2c9b7d41a6
+Create Date: 2026-10-18 14:03:51.227640
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5b1e7c2a9d40"
+down_revision = "3f2c9b7d41a6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.add_column(
+            sa.Column("token_version", sa.Integer(), server_default="0", nullable=False)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("token_version")
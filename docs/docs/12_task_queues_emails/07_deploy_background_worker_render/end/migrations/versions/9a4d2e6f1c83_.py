@@ -0,0 +1,42 @@
+"""empty message
+
+Revision ID: 9a4d2e6f1c83
+Revises: 5b1e7c2a9d40
+Create Date: 2026-10-18 15:26:09.514382
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9a4d2e6f1c83"
+down_revision = "5b1e7c2a9d40"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    roles = op.create_table(
+        "roles",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=80), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_table(
+        "users_roles",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("role_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["role_id"], ["roles.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("user_id", "role_id", name="uq_users_roles_user_id_role_id"),
+    )
+    op.bulk_insert(roles, [{"name": "admin"}])
+
+
+def downgrade():
+    op.drop_table("users_roles")
+    op.drop_table("roles")
@@ -0,0 +1,43 @@
+"""empty message
+
+Revision ID: c7e3a1f05b92
+Revises: 9a4d2e6f1c83
+Create Date: 2026-10-18 16:41:22.093817
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "c7e3a1f05b92"
+down_revision = "9a4d2e6f1c83"
+branch_labels = None
+depends_on = None
+
+# The foreign keys were created unnamed; this convention gives them the names
+# PostgreSQL chose, so SQLite batch mode can find them too
+NAMING_CONVENTION = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+FOREIGN_KEYS = [
+    ("items", "store_id", "stores"),
+    ("tags", "store_id", "stores"),
+    ("items_tags", "item_id", "items"),
+    ("items_tags", "tag_id", "tags"),
+]
+
+
+def _recreate_foreign_keys(ondelete):
+    for table, column, referred_table in FOREIGN_KEYS:
+        name = f"{table}_{column}_fkey"
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(name, type_="foreignkey")
+            batch_op.create_foreign_key(
+                name, referred_table, [column], ["id"], ondelete=ondelete
+            )
+
+
+def upgrade():
+    _recreate_foreign_keys("CASCADE")
+
+
+def downgrade():
+    _recreate_foreign_keys(None)
@@ -0,0 +1,23 @@
+"""empty message
+
+Revision ID: e2b8d4c6a017
+Revises: c7e3a1f05b92
+Create Date: 2026-10-18 17:20:45.661904
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "e2b8d4c6a017"
+down_revision = "c7e3a1f05b92"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f("ix_items_tags_tag_id"), "items_tags", ["tag_id"], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f("ix_items_tags_tag_id"), table_name="items_tags")
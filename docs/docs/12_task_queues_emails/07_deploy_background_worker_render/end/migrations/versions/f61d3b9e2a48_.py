@@ -0,0 +1,53 @@
+"""empty message
+
+Revision ID: f61d3b9e2a48
+Revises: e2b8d4c6a017
+Create Date: 2026-10-18 18:02:13.870245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f61d3b9e2a48"
+down_revision = "e2b8d4c6a017"
+branch_labels = None
+depends_on = None
+
+# users.username and users.email already have unique indexes, and
+# items_tags.tag_id was indexed in e2b8d4c6a017
+INDEXES = [
+    ("ix_items_store_id", "items", ["store_id"], False),
+    ("ix_tags_store_id", "tags", ["store_id"], False),
+    ("uq_items_tags_item_id_tag_id", "items_tags", ["item_id", "tag_id"], True),
+]
+
+
+def upgrade():
+    # Links missing a side or duplicated would break the new constraints
+    op.execute("DELETE FROM items_tags WHERE item_id IS NULL OR tag_id IS NULL")
+    op.execute(
+        "DELETE FROM items_tags WHERE id NOT IN "
+        "(SELECT MIN(id) FROM items_tags GROUP BY item_id, tag_id)"
+    )
+    # Batch mode recreates the table on SQLite, which can't alter columns
+    with op.batch_alter_table("items_tags") as batch_op:
+        batch_op.alter_column("item_id", existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column("tag_id", existing_type=sa.Integer(), nullable=False)
+
+    # CREATE INDEX CONCURRENTLY doesn't block writes on PostgreSQL, but can't
+    # run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+    with op.batch_alter_table("items_tags") as batch_op:
+        batch_op.alter_column("tag_id", existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column("item_id", existing_type=sa.Integer(), nullable=True)
@@ -2,4 +2,6 @@ from models.store import StoreModel
 from models.item import ItemModel
 from models.tag import TagModel
 from models.item_tags import ItemTags
-from models.user import UserModel
\ No newline at end of file
+from models.user import UserModel
+from models.role import RoleModel
+from models.user_roles import UserRoles
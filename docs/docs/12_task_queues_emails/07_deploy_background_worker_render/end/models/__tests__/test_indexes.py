@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from models import ItemModel, ItemTags, RoleModel, TagModel, UserModel, UserRoles
+
+
+def query_plan(query):
+    sql = query.statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    rows = db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return " ".join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize(
+    "build_query, expected",
+    [
+        (
+            lambda: db.session.query(ItemModel.id).filter(ItemModel.store_id == 1),
+            "INDEX ix_items_store_id (store_id=?)",
+        ),
+        (
+            lambda: db.session.query(TagModel.id).filter(TagModel.store_id == 1),
+            "INDEX ix_tags_store_id (store_id=?)",
+        ),
+        (
+            lambda: db.session.query(ItemTags.tag_id).filter(ItemTags.item_id == 1),
+            "INDEX uq_items_tags_item_id_tag_id (item_id=?)",
+        ),
+        (
+            lambda: db.session.query(ItemTags.id).filter(ItemTags.tag_id == 1),
+            "INDEX ix_items_tags_tag_id (tag_id=?)",
+        ),
+        (
+            lambda: db.session.query(UserModel.id).filter(UserModel.username == "jose"),
+            "(username=?)",
+        ),
+        (
+            lambda: db.session.query(UserRoles.role_id).filter(UserRoles.user_id == 1),
+            "(user_id=?)",
+        ),
+    ],
+)
+def test_hot_queries_use_indexes(app, build_query, expected):
+    with app.app_context():
+        plan = query_plan(build_query())
+
+    assert plan.startswith("SEARCH")
+    assert expected in plan
+
+
+def test_item_tag_link_is_unique(app):
+    with app.app_context():
+        db.session.add_all([ItemTags(item_id=1, tag_id=1), ItemTags(item_id=1, tag_id=1)])
+
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+
+
+def test_user_role_is_unique(app, user_id):
+    with app.app_context():
+        role = RoleModel(name="admin")
+        db.session.add(role)
+        db.session.flush()
+        db.session.add_all(
+            [UserRoles(user_id=user_id, role_id=role.id), UserRoles(user_id=user_id, role_id=role.id)]
+        )
+
+        with pytest.raises(IntegrityError):
+            db.session.commit()
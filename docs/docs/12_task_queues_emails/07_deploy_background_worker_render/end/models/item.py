@@ -1,13 +1,16 @@
 from sqlalchemy import ForeignKey
 from db import db
+from models.timestamp import TimestampMixin
 
-class ItemModel(db.Model):
+class ItemModel(TimestampMixin, db.Model):
     __tablename__ = "items"
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), unique=False, nullable=False)
     description = db.Column(db.String)
     price = db.Column(db.Float(precision=2), unique=False, nullable=False)
-    store_id = db.Column(db.Integer, db.ForeignKey("stores.id"), unique=False, nullable=False)
+    store_id = db.Column(db.Integer, db.ForeignKey("stores.id", ondelete="CASCADE"), unique=False, nullable=False, index=True)
     store = db.relationship("StoreModel", back_populates="items")
-    tags = db.relationship("TagModel", back_populates="items", secondary="items_tags")
\ No newline at end of file
+    tags = db.relationship(
+        "TagModel", back_populates="items", secondary="items_tags", passive_deletes=True
+    )
\ No newline at end of file
@@ -4,6 +4,17 @@ from db import db
 class ItemTags(db.Model):
     __tablename__ = "items_tags"
 
+    # An item is linked to a tag at most once. The unique index also serves
+    # lookups by item_id
+    __table_args__ = (
+        db.Index("uq_items_tags_item_id_tag_id", "item_id", "tag_id", unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    item_id = db.Column(db.Integer, db.ForeignKey("items.id"))
-    tag_id = db.Column(db.Integer, db.ForeignKey("tags.id"))
\ No newline at end of file
+    item_id = db.Column(
+        db.Integer, db.ForeignKey("items.id", ondelete="CASCADE"), nullable=False
+    )
+    # Indexed for the "is this tag used" check when deleting tags
+    tag_id = db.Column(
+        db.Integer, db.ForeignKey("tags.id", ondelete="CASCADE"), nullable=False, index=True
+    )
\ No newline at end of file
@@ -0,0 +1,10 @@
+from db import db
+
+
+class RoleModel(db.Model):
+    __tablename__ = "roles"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), unique=True, nullable=False)
+
+    users = db.relationship("UserModel", back_populates="roles", secondary="users_roles")
@@ -1,10 +1,17 @@
 from db import db
+from models.timestamp import TimestampMixin
 
 
-class StoreModel(db.Model):
+class StoreModel(TimestampMixin, db.Model):
     __tablename__ = "stores"
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), unique=True, nullable=False)
-    items = db.relationship("ItemModel", back_populates="store", lazy="dynamic")
-    tags = db.relationship("TagModel", back_populates="store", lazy="dynamic")
\ No newline at end of file
+    # The database deletes the children (ON DELETE CASCADE), so deleting a
+    # store doesn't load them
+    items = db.relationship(
+        "ItemModel", back_populates="store", cascade="all, delete", passive_deletes=True
+    )
+    tags = db.relationship(
+        "TagModel", back_populates="store", cascade="all, delete", passive_deletes=True
+    )
\ No newline at end of file
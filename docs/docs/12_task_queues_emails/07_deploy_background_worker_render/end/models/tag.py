@@ -1,12 +1,15 @@
 from db import db
+from models.timestamp import TimestampMixin
 
 
-class TagModel(db.Model):
+class TagModel(TimestampMixin, db.Model):
     __tablename__ = "tags"
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), unique=False, nullable=False)
-    store_id = db.Column(db.Integer, db.ForeignKey("stores.id"), nullable=False)
+    store_id = db.Column(db.Integer, db.ForeignKey("stores.id", ondelete="CASCADE"), nullable=False, index=True)
 
     store = db.relationship("StoreModel", back_populates="tags")
-    items = db.relationship("ItemModel", back_populates="tags", secondary="items_tags")
\ No newline at end of file
+    items = db.relationship(
+        "ItemModel", back_populates="tags", secondary="items_tags", passive_deletes=True
+    )
\ No newline at end of file
@@ -0,0 +1,28 @@
+from datetime import datetime, timezone
+
+from db import db
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class TimestampMixin:
+    """Adds an `updated_at` column, refreshed whenever the row is updated.
+
+    Conditional GETs use it to tell whether a representation changed. Call
+    `touch()` when something the row's representation shows changed elsewhere
+    (e.g. a tag was linked to an item).
+    """
+
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=utcnow,
+        onupdate=utcnow,
+        server_default=db.func.now(),
+        index=True,
+    )
+
+    def touch(self):
+        self.updated_at = utcnow()
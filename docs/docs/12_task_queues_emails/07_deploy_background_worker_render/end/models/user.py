@@ -8,3 +8,8 @@ class UserModel(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String, unique=True, nullable=False)
     password = db.Column(db.String(256), nullable=False)
+    # Tokens carry the version they were issued with; incrementing it revokes
+    # every token of the user at once
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    roles = db.relationship("RoleModel", back_populates="users", secondary="users_roles")
@@ -0,0 +1,15 @@
+from db import db
+
+
+class UserRoles(db.Model):
+    __tablename__ = "users_roles"
+
+    # A user has a role at most once. The unique index also serves lookups by
+    # user_id
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "role_id", name="uq_users_roles_user_id_role_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    role_id = db.Column(db.Integer, db.ForeignKey("roles.id", ondelete="CASCADE"), nullable=False)
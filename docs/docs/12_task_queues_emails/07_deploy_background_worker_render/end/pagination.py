@@ -0,0 +1,164 @@
+"""
+pagination.py
+
+Keyset (cursor) pagination for collection endpoints.
+
+Instead of `page`/`page_size` (which makes the database count and skip rows),
+clients ask for `?limit=` rows and pass back the opaque `after` cursor from the
+previous response to get the next page. The cursor encodes the last primary key
+that was returned, so every page is a cheap `WHERE id > :after ORDER BY id LIMIT :limit`
+query no matter how deep into the collection the client is.
+
+The `Blueprint` defined here is a drop-in replacement for the flask-smorest one:
+`@blp.paginate()` parses and documents the cursor arguments, and the response
+gets an `X-Pagination` header and a `Link: <...>; rel="next"` header.
+"""
+import base64
+import binascii
+import http
+import json
+from copy import deepcopy
+from functools import wraps
+from urllib.parse import urlencode
+
+import marshmallow as ma
+from flask import Response, request
+from flask_smorest import Blueprint as BaseBlueprint
+from flask_smorest.utils import unpack_tuple_response
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(last_id):
+    payload = json.dumps({"id": last_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        return int(payload["id"])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ma.ValidationError("Invalid cursor.")
+
+
+class CursorParameters:
+    """Holds the parsed cursor arguments for one request.
+
+    The view passes its query to `paginate_query`, which sets `next_cursor`
+    so the blueprint can build the response metadata.
+    """
+
+    def __init__(self, limit, after=None):
+        self.limit = limit
+        self.after = after
+        self.next_cursor = None
+
+    def paginate_query(self, query, key):
+        """Return one page of `query`, ordered by the unique column `key`."""
+        if self.after is not None:
+            query = query.filter(key > self.after)
+
+        # Fetch one extra row to find out whether there is a next page,
+        # so we never need a COUNT(*) over the whole table.
+        rows = query.order_by(key).limit(self.limit + 1).all()
+        if len(rows) > self.limit:
+            rows = rows[: self.limit]
+            self.next_cursor = encode_cursor(rows[-1].id)
+        return rows
+
+
+def _cursor_parameters_schema_factory(def_page_size, def_max_page_size):
+    class CursorParametersSchema(ma.Schema):
+        class Meta:
+            ordered = True
+            unknown = ma.EXCLUDE
+
+        limit = ma.fields.Integer(
+            load_default=def_page_size,
+            validate=ma.validate.Range(min=1, max=def_max_page_size),
+        )
+        after = ma.fields.String(
+            metadata={"description": "Cursor returned as `next_cursor` by the previous page."}
+        )
+
+        @ma.post_load
+        def make_cursor_parameters(self, data, **kwargs):
+            after = data.get("after")
+            return CursorParameters(
+                limit=data["limit"],
+                after=decode_cursor(after) if after is not None else None,
+            )
+
+    return CursorParametersSchema
+
+
+class CursorMetadataSchema(ma.Schema):
+    limit = ma.fields.Int()
+    next_cursor = ma.fields.Str(allow_none=True)
+
+
+class Blueprint(BaseBlueprint):
+    """flask-smorest Blueprint whose `paginate` uses keyset cursors."""
+
+    def paginate(self, pager=None, *, page_size=DEFAULT_PAGE_SIZE, max_page_size=MAX_PAGE_SIZE):
+        if pager is not None:
+            raise TypeError("Cursor pagination is done in the view, pass no pager.")
+
+        params_schema = _cursor_parameters_schema_factory(page_size, max_page_size)
+        error_status_code = self.PAGINATION_ARGUMENTS_PARSER.DEFAULT_VALIDATION_STATUS
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                cursor_params = self.PAGINATION_ARGUMENTS_PARSER.parse(
+                    params_schema, request, location="query"
+                )
+                kwargs["pagination_parameters"] = cursor_params
+
+                result, status, headers = unpack_tuple_response(func(*args, **kwargs))
+                # Streamed responses hold the whole collection, there is no next page
+                if not (isinstance(result, Response) and result.is_streamed):
+                    headers = self._set_cursor_metadata(cursor_params, headers)
+                return result, status, headers
+
+            wrapper._apidoc = deepcopy(getattr(wrapper, "_apidoc", {}))
+            wrapper._apidoc["pagination"] = {
+                "parameters": {"in": "query", "schema": params_schema},
+                "response": {
+                    error_status_code: http.HTTPStatus(error_status_code).name,
+                },
+            }
+            return wrapper
+
+        return decorator
+
+    def _set_cursor_metadata(self, cursor_params, headers):
+        if headers is None:
+            headers = {}
+        headers[self.PAGINATION_HEADER_NAME] = json.dumps(
+            CursorMetadataSchema().dump(
+                {"limit": cursor_params.limit, "next_cursor": cursor_params.next_cursor}
+            )
+        )
+        if cursor_params.next_cursor is not None:
+            args = request.args.to_dict()
+            args.update(limit=cursor_params.limit, after=cursor_params.next_cursor)
+            headers["Link"] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+        return headers
+
+    def _document_pagination_metadata(self, spec, resp_doc):
+        resp_doc.setdefault("headers", {}).update(
+            {
+                self.PAGINATION_HEADER_NAME: {
+                    "description": "Cursor pagination metadata",
+                    "schema": CursorMetadataSchema,
+                },
+                "Link": {
+                    "description": 'URL of the next page, as `<url>; rel="next"`. Absent on the last page.',
+                    "schema": {"type": "string"},
+                },
+            }
+        )
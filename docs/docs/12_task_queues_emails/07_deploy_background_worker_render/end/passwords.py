@@ -0,0 +1,88 @@
+"""
+passwords.py
+
+Password hashing, configured through a passlib `CryptContext`.
+
+`PASSWORD_SCHEMES` lists the accepted schemes, e.g. `["argon2",
+"pbkdf2_sha256"]`. New hashes use the first one and hashes of the others are
+deprecated. `PASSWORD_ROUNDS` sets the cost of the first scheme (iterations for
+pbkdf2, log2 rounds for bcrypt, time cost for argon2). bcrypt and argon2 need
+the `bcrypt` and `argon2-cffi` packages.
+
+When a user logs in with a hash that uses a deprecated scheme or a lower cost
+than configured, `verify_password` returns a new hash so the login can store
+it. Raising the cost therefore upgrades users as they log in.
+
+Run `flask calibrate-password-hashing` on the production machine to choose a
+`PASSWORD_ROUNDS` for a target verify latency.
+"""
+import math
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from passlib.context import CryptContext
+
+
+def _context():
+    context = current_app.extensions.get("password_context")
+    if context is None:
+        schemes = current_app.config.get("PASSWORD_SCHEMES", ["pbkdf2_sha256"])
+        settings = {"schemes": schemes, "deprecated": ["auto"]}
+        rounds = current_app.config.get("PASSWORD_ROUNDS")
+        if rounds:
+            settings[f"{schemes[0]}__default_rounds"] = rounds
+            # Hashes below this cost are rehashed on login
+            settings[f"{schemes[0]}__min_rounds"] = rounds
+        context = CryptContext(**settings)
+        context = current_app.extensions.setdefault("password_context", context)
+    return context
+
+
+def hash_password(password):
+    return _context().hash(password)
+
+
+def verify_password(password, password_hash):
+    """Check a password against its stored hash.
+
+    Returns `(valid, new_hash)`, where `new_hash` is a hash to store in place
+    of the old one if it is outdated, otherwise `None`.
+    """
+    return _context().verify_and_update(password, password_hash)
+
+
+def _time_hash(handler, rounds, samples=3):
+    hasher = handler.using(rounds=rounds)
+    best = math.inf
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher.hash("calibration password")
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@click.command("calibrate-password-hashing")
+@click.option("--target-ms", default=250, show_default=True, help="Target verify latency.")
+@click.option("--scheme", default=None, help="Scheme to calibrate, the default one if omitted.")
+@with_appcontext
+def calibrate_password_hashing(target_ms, scheme):
+    """Benchmark this machine and print the PASSWORD_ROUNDS to use."""
+    handler = _context().handler(scheme)
+    target = target_ms / 1000
+    rounds = handler.default_rounds
+
+    # Verifying costs the same as hashing, so time hashes. Two passes, as the
+    # first estimate from the default cost can be off for very cheap hashes.
+    for _ in range(2):
+        elapsed = _time_hash(handler, rounds)
+        if handler.rounds_cost == "log2":
+            rounds = round(rounds + math.log2(target / elapsed))
+        else:
+            rounds = round(rounds * target / elapsed)
+        rounds = max(handler.min_rounds, min(rounds, handler.max_rounds or rounds))
+
+    elapsed = _time_hash(handler, rounds)
+    click.echo(f"{handler.name}: {rounds} rounds take {elapsed * 1000:.0f} ms to verify.")
+    click.echo(f"PASSWORD_ROUNDS={rounds}")
@@ -0,0 +1,113 @@
+import itertools
+import uuid
+
+import pytest
+from rq.exceptions import NoSuchJobError
+
+
+@pytest.fixture()
+def created_store_id(client):
+    response = client.post(
+        "/store",
+        json={"name": "Test Store"},
+    )
+
+    return response.json["id"]
+
+
+@pytest.fixture()
+def created_item_id(client, fresh_jwt, created_store_id):
+    response = client.post(
+        "/item",
+        json={"name": "Test Item", "price": 10.5, "store_id": created_store_id},
+        headers={"Authorization": f"Bearer {fresh_jwt}"},
+    )
+
+    return response.json["id"]
+
+
+@pytest.fixture()
+def created_tag_id(client, created_store_id):
+    response = client.post(
+        f"/store/{created_store_id}/tag",
+        json={"name": "Test Tag"},
+    )
+
+    return response.json["id"]
+
+
+@pytest.fixture()
+def create_catalog(client, fresh_jwt):
+    """Creates `store_count` stores, each with `item_count` items tagged with one tag."""
+
+    store_numbers = itertools.count()
+
+    def create(store_count, item_count):
+        for _ in range(store_count):
+            s = next(store_numbers)
+            store_id = client.post("/store", json={"name": f"Store {s}"}).json["id"]
+            tag_id = client.post(
+                f"/store/{store_id}/tag", json={"name": f"Tag {s}"}
+            ).json["id"]
+            for i in range(item_count):
+                item_id = client.post(
+                    "/item",
+                    json={"name": f"Item {s}-{i}", "price": 1.0, "store_id": store_id},
+                    headers={"Authorization": f"Bearer {fresh_jwt}"},
+                ).json["id"]
+                client.post(f"/item/{item_id}/tag/{tag_id}")
+
+    return create
+
+
+class FakeJob:
+    def __init__(self, job_id, func_name, args=(), status="queued", connection=None):
+        self.id = job_id
+        self.func_name = func_name
+        self.args = args
+        self.status = status
+        self.connection = connection
+        self.meta = {}
+        self.saved_meta = {}
+
+    @property
+    def is_finished(self):
+        return self.status == "finished"
+
+    @property
+    def is_failed(self):
+        return self.status == "failed"
+
+    def get_status(self):
+        return self.status
+
+    def save_meta(self):
+        self.saved_meta = dict(self.meta)
+
+
+@pytest.fixture()
+def fake_jobs(monkeypatch):
+    """Replaces the RQ queue and job lookups of a resource module.
+
+    Call it with the module and existing `(job_id, func_name, status)` jobs,
+    it returns the jobs by id, including the ones enqueued afterwards.
+    """
+
+    def patch(module, *existing):
+        jobs = {job_id: FakeJob(job_id, func_name, status=status) for job_id, func_name, status in existing}
+
+        def fetch(job_id, connection):
+            if job_id not in jobs:
+                raise NoSuchJobError(job_id)
+            return jobs[job_id]
+
+        def enqueue(func_name, *args, job_id=None, **kwargs):
+            job_id = job_id or uuid.uuid4().hex
+            jobs[job_id] = FakeJob(job_id, func_name, args)
+            return jobs[job_id]
+
+        monkeypatch.setattr(f"{module}.Job.fetch", fetch)
+        monkeypatch.setattr(f"{module}.queue.enqueue", enqueue)
+        return jobs
+
+    return patch
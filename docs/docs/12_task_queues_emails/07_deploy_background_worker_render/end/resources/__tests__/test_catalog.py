@@ -0,0 +1,314 @@
+import io
+import os
+
+import pytest
+
+import tasks
+from app import create_app
+from catalog import CatalogFormatError, import_records, read_ndjson
+from db import db
+from models import ItemModel, ItemTags, StoreModel, TagModel
+from tasks import _payload_lines
+
+
+def empty_catalog(app):
+    with app.app_context():
+        for model in (ItemTags, ItemModel, TagModel, StoreModel):
+            db.session.query(model).delete()
+        db.session.commit()
+
+
+@pytest.mark.parametrize(
+    "file_format, mimetype", [("ndjson", "application/x-ndjson"), ("csv", "text/csv")]
+)
+def test_export_import_round_trip(app, client, admin_jwt, create_catalog, file_format, mimetype):
+    create_catalog(store_count=2, item_count=3)
+    headers = {"Authorization": f"Bearer {admin_jwt}"}
+
+    exported = client.get(f"/export?format={file_format}", headers=headers)
+    assert exported.status_code == 200
+    assert exported.mimetype == mimetype
+
+    empty_catalog(app)
+
+    response = client.post("/import", data=exported.data, content_type=mimetype, headers=headers)
+
+    assert response.status_code == 201
+    assert response.json == {"stores": 2, "tags": 2, "items": 6, "links": 6}
+    assert client.get(f"/export?format={file_format}", headers=headers).data == exported.data
+
+
+def test_import_unknown_record_type(client, admin_jwt):
+    response = client.post(
+        "/import",
+        data='{"type": "store", "id": 1, "name": "Store"}\n{"type": "shelf"}\n',
+        content_type="application/x-ndjson",
+        headers={"Authorization": f"Bearer {admin_jwt}"},
+    )
+
+    assert response.status_code == 400
+    assert response.json["message"] == "Line 2: unknown record type 'shelf'."
+
+
+def test_import_refreshes_existing_stores(app, client, admin_jwt, created_store_id):
+    first = client.get(f"/store/{created_store_id}")
+    assert client.get(f"/store/{created_store_id}").headers["X-Cache"] == "HIT"
+    with app.app_context():
+        updated_at = db.session.get(StoreModel, created_store_id).updated_at
+
+    response = client.post(
+        "/import",
+        data=f'{{"type": "item", "id": 100, "name": "Imported", "price": 1.5, "store_id": {created_store_id}}}\n',
+        content_type="application/x-ndjson",
+        headers={"Authorization": f"Bearer {admin_jwt}"},
+    )
+
+    assert response.status_code == 201
+    after = client.get(f"/store/{created_store_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.headers["X-Cache"] == "MISS"
+    assert [item["name"] for item in after.json["items"]] == ["Imported"]
+    with app.app_context():
+        assert db.session.get(StoreModel, created_store_id).updated_at > updated_at
+
+
+@pytest.fixture()
+def postgres_app():
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("Set TEST_POSTGRES_URL to test imports with COPY.")
+    pytest.importorskip("psycopg2")
+
+    app = create_app(url)
+    app.config.update({"TESTING": True, "JWT_BLOCKLIST_BACKEND": "memory"})
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def test_import_with_copy_on_postgres(postgres_app):
+    lines = [
+        '{"type": "store", "id": 1, "name": "Store, \\"quoted\\""}\n',
+        '{"type": "tag", "id": 1, "name": "Tag", "store_id": 1}\n',
+        '{"type": "item", "id": 1, "name": "Item", "description": null, "price": 1.5, "store_id": 1}\n',
+        '{"type": "link", "item_id": 1, "tag_id": 1}\n',
+    ]
+
+    with postgres_app.app_context():
+        counts = import_records(read_ndjson(lines), batch_size=2)
+
+        assert counts == {"store": 1, "tag": 1, "item": 1, "link": 1}
+        item = db.session.get(ItemModel, 1)
+        assert item.description is None and item.updated_at is not None
+        assert [tag.name for tag in item.tags] == ["Tag"]
+        assert db.session.get(StoreModel, 1).name == 'Store, "quoted"'
+        # The sequences were moved past the imported ids
+        store = StoreModel(name="New Store")
+        db.session.add(store)
+        db.session.commit()
+        assert store.id == 2
+
+
+def test_export_requires_admin(client, jwt):
+    response = client.get("/export", headers={"Authorization": f"Bearer {jwt}"})
+
+    assert response.status_code == 401
+
+
+def test_catalog_cli_round_trip(app, create_catalog, tmp_path):
+    create_catalog(store_count=1, item_count=2)
+    runner = app.test_cli_runner()
+    path = tmp_path / "catalog.ndjson"
+
+    result = runner.invoke(args=["catalog", "export", "--output", str(path)])
+    assert result.exit_code == 0
+
+    empty_catalog(app)
+    result = runner.invoke(args=["catalog", "import", str(path), "--batch-size", "2"])
+
+    assert result.exit_code == 0
+    assert result.output == "1 stores, 1 tags, 2 items, 2 links\n"
+
+
+def test_import_reports_progress(app):
+    lines = [f'{{"type": "store", "id": {i}, "name": "Store {i}"}}\n' for i in range(1, 6)]
+    progress = []
+
+    with app.app_context():
+        import_records(
+            read_ndjson(lines),
+            batch_size=2,
+            on_batch=lambda counts: progress.append(counts["store"]),
+        )
+
+    assert progress == [2, 4, 5]
+
+
+def test_ingest_payload_lines_across_chunks():
+    class Payload:
+        def __init__(self, data):
+            self.data = data
+
+        def getrange(self, key, start, end):
+            return self.data[start : end + 1]
+
+    payload = Payload(b'{"a": 1}\n{"b": "\xc3\xa9"}\nlast')
+
+    assert list(_payload_lines(payload, "key", chunk_size=4)) == [
+        '{"a": 1}\n',
+        '{"b": "é"}\n',
+        "last",
+    ]
+
+
+def test_ingest_requires_admin(client, jwt):
+    response = client.post(
+        "/ingest",
+        data="",
+        content_type="application/x-ndjson",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+
+    assert response.status_code == 401
+
+
+@pytest.fixture()
+def ingest(app, monkeypatch, fake_redis, fake_jobs):
+    """POST /ingest with a fake Redis and queue, then `run(job)` the worker task."""
+    monkeypatch.setattr("resources.catalog.connection", fake_redis)
+    jobs = fake_jobs("resources.catalog")
+    # The task builds its own app, use the test one and its database
+    monkeypatch.setattr("app.create_app", lambda: app)
+
+    def run(job):
+        job.connection = fake_redis
+        monkeypatch.setattr("tasks.get_current_job", lambda: job)
+        return tasks.ingest_catalog(*job.args)
+
+    return jobs, run
+
+
+def test_ingest_runs_import_in_worker(app, client, admin_jwt, fake_redis, ingest):
+    jobs, run = ingest
+    app.config["INGEST_BATCH_SIZE"] = 2
+    payload = "".join(f'{{"type": "store", "id": {i}, "name": "Store {i}"}}\n' for i in range(1, 4))
+
+    response = client.post(
+        "/ingest",
+        data=payload,
+        content_type="application/x-ndjson",
+        headers={"Authorization": f"Bearer {admin_jwt}"},
+    )
+
+    assert response.status_code == 202
+    job = jobs[response.json["job_id"]]
+    key, file_format = job.args
+    assert job.func_name == "tasks.ingest_catalog" and file_format == "ndjson"
+    assert fake_redis.get(key) == payload.encode()
+    assert fake_redis.ttl(key) == app.config["INGEST_PAYLOAD_TTL"]
+
+    run(job)
+
+    assert job.saved_meta == {
+        "counts": {"stores": 3, "tags": 0, "items": 0, "links": 0},
+        "errors": [],
+    }
+    assert fake_redis.get(key) is None
+    with app.app_context():
+        assert db.session.query(StoreModel).count() == 3
+
+
+def test_ingest_keeps_committed_batches_on_error(app, client, admin_jwt, fake_redis, ingest):
+    jobs, run = ingest
+    app.config["INGEST_BATCH_SIZE"] = 2
+    payload = (
+        '{"type": "store", "id": 1, "name": "Store 1"}\n'
+        '{"type": "store", "id": 2, "name": "Store 2"}\n'
+        '{"type": "shelf"}\n'
+    )
+    response = client.post(
+        "/ingest",
+        data=payload,
+        content_type="application/x-ndjson",
+        headers={"Authorization": f"Bearer {admin_jwt}"},
+    )
+    job = jobs[response.json["job_id"]]
+
+    with pytest.raises(CatalogFormatError):
+        run(job)
+
+    assert job.saved_meta["counts"]["stores"] == 2
+    assert job.saved_meta["errors"] == ["Line 3: unknown record type 'shelf'."]
+    assert fake_redis.get(job.args[0]) is None
+    with app.app_context():
+        assert db.session.query(StoreModel).count() == 2
+
+
+def test_ingest_payload_limit(app, client, admin_jwt, fake_redis, ingest):
+    jobs, _ = ingest
+    app.config["INGEST_MAX_BYTES"] = 10
+
+    response = client.post(
+        "/ingest",
+        data='{"type": "store", "id": 1, "name": "Store 1"}\n',
+        content_type="application/x-ndjson",
+        headers={"Authorization": f"Bearer {admin_jwt}"},
+    )
+
+    assert response.status_code == 413
+    assert jobs == {} and fake_redis.values == {}
+
+
+def test_ingest_drops_payload_of_broken_upload(client, admin_jwt, fake_redis, ingest):
+    jobs, _ = ingest
+    expiries = []
+
+    class BrokenUpload(io.BytesIO):
+        def readinto(self, buffer):
+            if self.tell():
+                # The first chunk is already in Redis, with a TTL
+                expiries.extend(fake_redis.ttl(key) for key in fake_redis.values)
+                raise OSError("Connection reset by peer")
+            return super().readinto(buffer)
+
+    response = client.post(
+        "/ingest",
+        input_stream=BrokenUpload(b'{"type": "store", "id": 1, "name": "Store 1"}\n'),
+        # More than is sent, so the stream is read again after the first chunk
+        environ_overrides={"CONTENT_LENGTH": "1000"},
+        content_type="application/x-ndjson",
+        headers={"Authorization": f"Bearer {admin_jwt}"},
+    )
+
+    assert response.status_code == 400
+    assert expiries and all(ttl > 0 for ttl in expiries)
+    assert jobs == {} and fake_redis.values == {}
+
+
+def test_ingest_status(client, admin_jwt, jwt, fake_jobs):
+    jobs = fake_jobs(
+        "resources.catalog",
+        ("ingest-1", "tasks.ingest_catalog", "started"),
+        ("delete-store-1", "tasks.delete_store", "started"),
+    )
+    jobs["ingest-1"].meta = {"counts": {"stores": 2, "tags": 0, "items": 0, "links": 0}, "errors": []}
+    headers = {"Authorization": f"Bearer {admin_jwt}"}
+
+    response = client.get("/ingest/ingest-1", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json == {
+        "job_id": "ingest-1",
+        "status": "started",
+        "counts": {"stores": 2, "tags": 0, "items": 0, "links": 0},
+        "errors": [],
+    }
+    # Other jobs of the shared Redis aren't ingest jobs
+    assert client.get("/ingest/delete-store-1", headers=headers).status_code == 404
+    assert client.get("/ingest/missing", headers=headers).status_code == 404
+    non_admin = {"Authorization": f"Bearer {jwt}"}
+    assert client.get("/ingest/ingest-1", headers=non_admin).status_code == 401
@@ -0,0 +1,134 @@
+from flask_jwt_extended import create_access_token
+
+from db import db
+from idempotency import IN_FLIGHT, get_idempotency_store
+from models import ItemModel, StoreModel, UserModel
+
+
+def test_store_post_replays_stored_response(client, app, count_queries):
+    headers = {"Idempotency-Key": "create-store-1"}
+    first = client.post("/store", json={"name": "Test Store"}, headers=headers)
+
+    with count_queries() as statements:
+        retry = client.post("/store", json={"name": "Test Store"}, headers=headers)
+
+    assert first.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.status_code == 200
+    assert retry.json == first.json
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert statements == []
+    with app.app_context():
+        assert StoreModel.query.count() == 1
+
+
+def test_post_without_key_is_not_replayed(client):
+    client.post("/store", json={"name": "Test Store"})
+    response = client.post("/store", json={"name": "Test Store"})
+
+    assert response.status_code == 400
+
+
+def test_key_reused_for_different_body(client):
+    headers = {"Idempotency-Key": "create-store-1"}
+    client.post("/store", json={"name": "Test Store"}, headers=headers)
+
+    response = client.post("/store", json={"name": "Other Store"}, headers=headers)
+
+    assert response.status_code == 422
+
+
+def test_key_in_flight_returns_conflict(client, app):
+    app.config["IDEMPOTENCY_WAIT"] = 0
+    headers = {"Idempotency-Key": "create-store-1"}
+    client.post("/store", json={"name": "Test Store"}, headers=headers)
+    with app.app_context():
+        store = get_idempotency_store()
+        key = next(iter(store._entries))
+        store.set(key, {**store.get(key), "state": IN_FLIGHT}, 60)
+
+    response = client.post("/store", json={"name": "Test Store"}, headers=headers)
+
+    assert response.status_code == 409
+
+
+def test_failed_request_is_not_stored(client, created_store_id):
+    headers = {"Idempotency-Key": "create-store-1"}
+    client.post("/store", json={"name": "Test Store"}, headers=headers)
+
+    response = client.post("/store", json={"name": "Test Store"}, headers=headers)
+
+    assert response.status_code == 400
+    assert "Idempotent-Replayed" not in response.headers
+
+
+def test_item_keys_are_scoped_to_the_caller(client, app, fresh_jwt, created_store_id):
+    item = {"name": "Test Item", "price": 10.5, "store_id": created_store_id}
+
+    def post(headers):
+        return client.post("/item", json=item, headers={"Idempotency-Key": "create-item-1", **headers})
+
+    first = post({"Authorization": f"Bearer {fresh_jwt}"})
+    retry = post({"Authorization": f"Bearer {fresh_jwt}"})
+    unauthenticated = post({})
+
+    assert first.status_code == 201
+    assert retry.json == first.json
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert unauthenticated.status_code == 401
+    with app.app_context():
+        assert ItemModel.query.count() == 1
+
+
+def test_item_keys_survive_a_token_refresh(client, app, fresh_jwt, user_id, created_store_id):
+    item = {"name": "Test Item", "price": 10.5, "store_id": created_store_id}
+    with app.app_context():
+        other_user = UserModel(username="other", email="other@example.com", password="x")
+        db.session.add(other_user)
+        db.session.commit()
+        refreshed_jwt = create_access_token(identity=user_id, fresh=True)
+        other_jwt = create_access_token(identity=other_user.id, fresh=True)
+
+    def post(token):
+        return client.post(
+            "/item",
+            json=item,
+            headers={"Idempotency-Key": "create-item-1", "Authorization": f"Bearer {token}"},
+        )
+
+    first = post(fresh_jwt)
+    retry = post(refreshed_jwt)
+    other = post(other_jwt)
+
+    assert refreshed_jwt != fresh_jwt
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json == first.json
+    assert "Idempotent-Replayed" not in other.headers
+    with app.app_context():
+        assert ItemModel.query.count() == 2
+
+
+def test_register_replay_skips_hashing_and_email(client, monkeypatch):
+    enqueued = []
+    monkeypatch.setattr("resources.user.queue_registration_email", lambda *args: enqueued.append(args))
+    user = {"username": "jose", "email": "jose@example.com", "password": "1234"}
+    headers = {"Idempotency-Key": "register-1"}
+
+    first = client.post("/register", json=user, headers=headers)
+    retry = client.post("/register", json=user, headers=headers)
+
+    assert first.status_code == 201
+    assert retry.status_code == 201
+    assert retry.json == first.json
+    assert len(enqueued) == 1
+
+
+def test_tag_post_replays(client, created_store_id):
+    headers = {"Idempotency-Key": "create-tag-1"}
+    first = client.post(f"/store/{created_store_id}/tag", json={"name": "Test Tag"}, headers=headers)
+    retry = client.post(f"/store/{created_store_id}/tag", json={"name": "Test Tag"}, headers=headers)
+
+    assert first.status_code == 201
+    assert retry.status_code == 201
+    assert retry.json == first.json
+    assert client.get(f"/store/{created_store_id}/tag").json == [first.json]
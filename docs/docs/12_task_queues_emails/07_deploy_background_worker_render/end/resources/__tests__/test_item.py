@@ -0,0 +1,306 @@
+import json
+
+
+def test_get_item_list_paginated(client, fresh_jwt, jwt, created_store_id):
+    for i in range(3):
+        client.post(
+            "/item",
+            json={"name": f"Test Item {i}", "price": 10.5, "store_id": created_store_id},
+            headers={"Authorization": f"Bearer {fresh_jwt}"},
+        )
+
+    response = client.get(
+        "/item?limit=2",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json] == [1, 2]
+    next_cursor = json.loads(response.headers["X-Pagination"])["next_cursor"]
+
+    response = client.get(
+        f"/item?limit=2&after={next_cursor}",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json] == [3]
+    assert json.loads(response.headers["X-Pagination"])["next_cursor"] is None
+
+
+def test_get_item_list_query_count(client, jwt, create_catalog, count_queries):
+    create_catalog(store_count=1, item_count=2)
+    with count_queries() as few:
+        client.get("/item", headers={"Authorization": f"Bearer {jwt}"})
+
+    create_catalog(store_count=3, item_count=5)
+    with count_queries() as many:
+        response = client.get("/item", headers={"Authorization": f"Bearer {jwt}"})
+
+    assert len(response.json) == 17
+    assert response.json[-1]["tags"] == [{"id": 4, "name": "Tag 3"}]
+    # version, items joined with their store, then tags
+    assert len(many) == len(few) == 3
+
+
+def test_get_item_query_count(client, jwt, create_catalog, count_queries):
+    create_catalog(store_count=1, item_count=1)
+    with count_queries() as statements:
+        response = client.get("/item/1", headers={"Authorization": f"Bearer {jwt}"})
+
+    assert response.json["store"] == {"id": 1, "name": "Store 0"}
+    assert len(statements) == 3
+
+
+def test_get_item_sparse_fields(client, jwt, create_catalog, count_queries):
+    create_catalog(store_count=1, item_count=1)
+    with count_queries() as statements:
+        response = client.get(
+            "/item/1?fields=id,name,price",
+            headers={"Authorization": f"Bearer {jwt}"},
+        )
+
+    assert response.status_code == 200
+    assert response.json == {"id": 1, "name": "Item 0-0", "price": 1.0}
+    # No store or tags loaded, and the description column is deferred
+    assert len(statements) == 2
+    assert "description" not in statements[1]
+
+
+def test_get_item_list_expand(client, jwt, create_catalog, count_queries):
+    create_catalog(store_count=1, item_count=3)
+    with count_queries() as statements:
+        response = client.get(
+            "/item?fields=name&expand=tags",
+            headers={"Authorization": f"Bearer {jwt}"},
+        )
+
+    assert response.status_code == 200
+    assert response.json[0] == {"name": "Item 0-0", "tags": [{"id": 1, "name": "Tag 0"}]}
+    assert len(statements) == 3
+
+
+def test_get_item_unknown_field(client, jwt, created_item_id):
+    response = client.get(
+        f"/item/{created_item_id}?fields=id,secret&expand=owner",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+
+    assert response.status_code == 422
+    assert "fields" in response.json["errors"]["query"]
+    assert "expand" in response.json["errors"]["query"]
+
+
+def test_get_item_list_stream(client, jwt, create_catalog):
+    create_catalog(store_count=2, item_count=30)
+    response = client.get(
+        "/item?stream=true&fields=id",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert "X-Pagination" not in response.headers
+    assert response.json == [{"id": i} for i in range(1, 61)]
+
+
+def test_get_item_list_ndjson(client, jwt, create_catalog):
+    create_catalog(store_count=1, item_count=3)
+    response = client.get(
+        "/item?expand=store",
+        headers={"Authorization": f"Bearer {jwt}", "Accept": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == [1, 2, 3]
+    assert lines[0]["store"] == {"id": 1, "name": "Store 0"}
+
+
+def test_get_item_etag_changes_when_tagged(
+    client, jwt, created_item_id, created_tag_id
+):
+    headers = {"Authorization": f"Bearer {jwt}"}
+    etag = client.get(f"/item/{created_item_id}", headers=headers).headers["ETag"]
+
+    client.post(f"/item/{created_item_id}/tag/{created_tag_id}")
+    response = client.get(
+        f"/item/{created_item_id}",
+        headers={**headers, "If-None-Match": etag},
+    )
+
+    assert response.status_code == 200
+    assert response.json["tags"] == [{"id": created_tag_id, "name": "Test Tag"}]
+    etag = response.headers["ETag"]
+
+    response = client.get(
+        f"/item/{created_item_id}",
+        headers={**headers, "If-None-Match": etag},
+    )
+    assert response.status_code == 304
+
+
+def test_create_items_bulk(client, fresh_jwt, jwt, created_store_id):
+    items = [{"name": f"Item {i}", "price": i, "store_id": created_store_id} for i in range(5)]
+    response = client.post(
+        "/item/bulk?batch_size=2",
+        json=items,
+        headers={"Authorization": f"Bearer {fresh_jwt}"},
+    )
+
+    assert response.status_code == 201
+    assert response.json["created"] == 5
+    assert response.json["results"] == [{"index": i, "id": i + 1} for i in range(5)]
+    response = client.get("/item", headers={"Authorization": f"Bearer {jwt}"})
+    assert [item["name"] for item in response.json] == [item["name"] for item in items]
+
+
+def test_create_items_bulk_atomic_rejects_all(client, fresh_jwt, jwt, created_store_id):
+    items = [
+        {"name": "Item 0", "price": 1, "store_id": created_store_id},
+        {"name": "Item 1", "store_id": created_store_id},
+        {"name": "Item 2", "price": 1, "store_id": 999},
+    ]
+    response = client.post(
+        "/item/bulk",
+        json=items,
+        headers={"Authorization": f"Bearer {fresh_jwt}"},
+    )
+
+    assert response.status_code == 422
+    assert response.json == {
+        "created": 0,
+        "results": [
+            {"index": 1, "errors": {"price": ["Missing data for required field."]}},
+            {"index": 2, "errors": {"store_id": ["Store not found."]}},
+        ],
+    }
+    assert client.get("/item", headers={"Authorization": f"Bearer {jwt}"}).json == []
+
+
+def test_create_items_bulk_partial(client, fresh_jwt, jwt, created_store_id):
+    items = [
+        {"name": "Item 0", "price": 1, "store_id": created_store_id},
+        {"name": "Item 1", "store_id": created_store_id},
+        {"name": "Item 2", "price": 2, "store_id": created_store_id},
+    ]
+    response = client.post(
+        "/item/bulk?atomic=false",
+        json=items,
+        headers={"Authorization": f"Bearer {fresh_jwt}"},
+    )
+
+    assert response.status_code == 207
+    assert response.json["created"] == 2
+    assert response.json["results"][0] == {"index": 0, "id": 1}
+    assert response.json["results"][1]["index"] == 1
+    assert "price" in response.json["results"][1]["errors"]
+    assert response.json["results"][2] == {"index": 2, "id": 2}
+    names = [item["name"] for item in client.get("/item", headers={"Authorization": f"Bearer {jwt}"}).json]
+    assert names == ["Item 0", "Item 2"]
+
+
+def test_create_items_bulk_requires_array(client, fresh_jwt):
+    response = client.post(
+        "/item/bulk",
+        json={"name": "Item"},
+        headers={"Authorization": f"Bearer {fresh_jwt}"},
+    )
+
+    assert response.status_code == 422
+
+
+def test_create_items_bulk_limit(app, client, fresh_jwt, created_store_id):
+    app.config["ITEM_BULK_MAX_ROWS"] = 2
+    items = [{"name": f"Item {i}", "price": i, "store_id": created_store_id} for i in range(3)]
+
+    response = client.post("/item/bulk", json=items, headers={"Authorization": f"Bearer {fresh_jwt}"})
+
+    assert response.status_code == 413
+
+
+def test_create_items_bulk_documents_body(client):
+    spec = client.get("/openapi.json").json
+
+    body = spec["paths"]["/item/bulk"]["post"]["requestBody"]["content"]["application/json"]
+    assert body["schema"]["type"] == "array"
+    assert body["schema"]["items"] == {"$ref": "#/components/schemas/ItemBulk"}
+
+
+def test_put_item_creates(client, created_store_id, count_queries):
+    with count_queries() as statements:
+        response = client.put(
+            "/item/5", json={"name": "New", "price": 2.5, "store_id": created_store_id}
+        )
+
+    assert response.status_code == 200
+    assert response.json == {"id": 5, "name": "New", "price": 2.5, "store_id": created_store_id}
+    # Touching the store the item would leave, then the upsert returning the row
+    assert len(statements) == 2
+    assert statements[0].startswith("UPDATE stores")
+    assert "ON CONFLICT" in statements[1]
+
+
+def test_put_item_update_is_one_statement(client, app, created_item_id, created_tag_id, count_queries):
+    client.post(f"/item/{created_item_id}/tag/{created_tag_id}")
+    client.get(f"/tag/{created_tag_id}")
+
+    with count_queries() as statements:
+        response = client.put(f"/item/{created_item_id}", json={"price": 20})
+
+    assert response.status_code == 200
+    assert len(statements) == 1
+    assert statements[0].startswith("UPDATE items")
+    # The tags show the item, their cached payloads were dropped
+    response = client.get(f"/tag/{created_tag_id}")
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json["items"][0]["price"] == 20.0
+
+
+def test_put_item_updates_sent_fields(client, jwt, created_item_id, created_store_id):
+    # Cache the item, the update must invalidate it
+    client.get(f"/item/{created_item_id}", headers={"Authorization": f"Bearer {jwt}"})
+
+    response = client.put(f"/item/{created_item_id}", json={"price": 20})
+
+    assert response.status_code == 200
+    assert response.json == {
+        "id": created_item_id,
+        "name": "Test Item",
+        "price": 20.0,
+        "store_id": created_store_id,
+    }
+    response = client.get(f"/item/{created_item_id}", headers={"Authorization": f"Bearer {jwt}"})
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json["price"] == 20.0
+
+
+def test_put_item_create_requires_all_fields(client):
+    response = client.put("/item/5", json={"price": 20})
+
+    assert response.status_code == 422
+    assert response.json["message"] == "Creating an item requires a name, price and store_id."
+
+
+def test_put_item_moving_store_changes_previous_store(
+    client, fresh_jwt, created_item_id, created_store_id, count_queries
+):
+    # A newer item stays, so the store's latest item timestamp doesn't change
+    client.post(
+        "/item",
+        json={"name": "Staying Item", "price": 1.0, "store_id": created_store_id},
+        headers={"Authorization": f"Bearer {fresh_jwt}"},
+    )
+    etag = client.get(f"/store/{created_store_id}").headers["ETag"]
+    other_store_id = client.post("/store", json={"name": "Other Store"}).json["id"]
+
+    with count_queries() as statements:
+        response = client.put(f"/item/{created_item_id}", json={"store_id": other_store_id})
+    assert response.status_code == 200
+    # The previous store is found and touched in SQL, nothing is read first
+    assert [statement.split()[0] for statement in statements] == ["UPDATE", "UPDATE"]
+
+    response = client.get(f"/store/{created_store_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [item["name"] for item in response.json["items"]] == ["Staying Item"]
@@ -0,0 +1,333 @@
+import json
+
+from sqlalchemy import event
+
+from cache import response_cache
+from db import db
+from models import ItemModel, ItemTags
+from resources.store import delete_store_rows
+
+
+def test_get_store_list_empty(client):
+    response = client.get(
+        "/store",
+    )
+
+    assert response.status_code == 200
+    assert response.json == []
+    assert json.loads(response.headers["X-Pagination"]) == {
+        "limit": 20,
+        "next_cursor": None,
+    }
+    assert "Link" not in response.headers
+
+
+def test_get_store_list_paginated(client):
+    for i in range(5):
+        client.post(
+            "/store",
+            json={"name": f"Test Store {i}"},
+        )
+
+    response = client.get(
+        "/store?limit=2",
+    )
+
+    assert response.status_code == 200
+    assert [store["id"] for store in response.json] == [1, 2]
+    next_cursor = json.loads(response.headers["X-Pagination"])["next_cursor"]
+    assert next_cursor
+    assert f"after={next_cursor}" in response.headers["Link"]
+    assert response.headers["Link"].endswith('rel="next"')
+
+    response = client.get(
+        f"/store?limit=2&after={next_cursor}",
+    )
+
+    assert [store["id"] for store in response.json] == [3, 4]
+    next_cursor = json.loads(response.headers["X-Pagination"])["next_cursor"]
+
+    response = client.get(
+        f"/store?limit=2&after={next_cursor}",
+    )
+
+    assert [store["id"] for store in response.json] == [5]
+    assert json.loads(response.headers["X-Pagination"])["next_cursor"] is None
+    assert "Link" not in response.headers
+
+
+def test_get_store_list_limit_too_large(client):
+    response = client.get(
+        "/store?limit=101",
+    )
+
+    assert response.status_code == 422
+    assert "limit" in response.json["errors"]["query"]
+
+
+def test_get_store_list_invalid_cursor(client):
+    response = client.get(
+        "/store?after=not-a-cursor",
+    )
+
+    assert response.status_code == 422
+    assert response.json["errors"]["query"]["_schema"] == ["Invalid cursor."]
+
+
+def test_get_store_list_query_count(client, create_catalog, count_queries):
+    create_catalog(store_count=2, item_count=2)
+    with count_queries() as few:
+        client.get("/store")
+
+    create_catalog(store_count=10, item_count=5)
+    with count_queries() as many:
+        response = client.get("/store")
+
+    assert len(response.json) == 12
+    assert len(response.json[-1]["items"]) == 5
+    # version, stores, items, tags
+    assert len(many) == len(few) == 4
+
+
+def test_get_store_query_count(client, create_catalog, count_queries):
+    create_catalog(store_count=1, item_count=20)
+    with count_queries() as statements:
+        response = client.get("/store/1")
+
+    assert len(response.json["items"]) == 20
+    assert len(statements) == 4
+
+
+def test_get_store_list_sparse_fields(client, create_catalog, count_queries):
+    create_catalog(store_count=3, item_count=2)
+    with count_queries() as statements:
+        response = client.get(
+            "/store?fields=name&limit=2",
+        )
+
+    assert response.status_code == 200
+    assert response.json == [{"name": "Store 0"}, {"name": "Store 1"}]
+    assert len(statements) == 2
+
+
+def test_get_store_expand_items(client, create_catalog):
+    create_catalog(store_count=1, item_count=1)
+    response = client.get(
+        "/store/1?expand=items",
+    )
+
+    assert response.status_code == 200
+    assert response.json == {
+        "id": 1,
+        "name": "Store 0",
+        "items": [{"id": 1, "name": "Item 0-0", "price": 1.0}],
+    }
+
+
+def test_get_store_list_stream_empty(client):
+    response = client.get(
+        "/store?stream=true",
+    )
+
+    assert response.status_code == 200
+    assert response.json == []
+
+
+def test_get_store_not_modified(app, client, created_store_id, count_queries):
+    response = client.get(
+        f"/store/{created_store_id}",
+    )
+    etag = response.headers["ETag"]
+    assert response.headers["Last-Modified"]
+
+    with app.app_context():
+        response_cache.invalidate(f"store:{created_store_id}")
+
+    with count_queries() as statements:
+        response = client.get(
+            f"/store/{created_store_id}",
+            headers={"If-None-Match": etag},
+        )
+
+    assert response.status_code == 304
+    assert response.data == b""
+    # Only the version lookup, the store itself is never loaded
+    assert len(statements) == 1
+
+
+def test_get_store_if_modified_since(client, created_store_id):
+    response = client.get(
+        f"/store/{created_store_id}",
+    )
+
+    response = client.get(
+        f"/store/{created_store_id}",
+        headers={"If-Modified-Since": response.headers["Last-Modified"]},
+    )
+
+    assert response.status_code == 304
+
+
+def test_get_store_etag_changes_with_items(client, fresh_jwt, created_store_id):
+    etag = client.get(f"/store/{created_store_id}").headers["ETag"]
+    client.post(
+        "/item",
+        json={"name": "Test Item", "price": 10.5, "store_id": created_store_id},
+        headers={"Authorization": f"Bearer {fresh_jwt}"},
+    )
+
+    response = client.get(
+        f"/store/{created_store_id}",
+        headers={"If-None-Match": etag},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json["items"]) == 1
+
+
+def test_get_store_list_etag(client, created_store_id):
+    response = client.get(
+        "/store",
+    )
+    etag = response.headers["ETag"]
+    assert "Last-Modified" not in response.headers
+
+    assert client.get("/store", headers={"If-None-Match": etag}).status_code == 304
+    # A different representation of the same data has another ETag
+    assert client.get("/store?fields=id", headers={"If-None-Match": etag}).status_code == 200
+
+    client.delete(f"/store/{created_store_id}")
+    assert client.get("/store", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_get_store_cached(client, created_store_id, count_queries):
+    response = client.get(
+        f"/store/{created_store_id}",
+    )
+    assert response.headers["X-Cache"] == "MISS"
+
+    with count_queries() as statements:
+        response = client.get(
+            f"/store/{created_store_id}",
+        )
+        not_modified = client.get(
+            f"/store/{created_store_id}",
+            headers={"If-None-Match": response.headers["ETag"]},
+        )
+
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.json == {"id": 1, "name": "Test Store", "items": [], "tags": []}
+    assert not_modified.status_code == 304
+    assert len(statements) == 0
+
+
+def test_get_store_cache_ignores_unknown_arguments(client, created_store_id):
+    client.get(f"/store/{created_store_id}?fields=id,name&x=1")
+
+    for query in ["fields=name,id", "fields=id,name&x=2", "x=3&fields=id,name"]:
+        response = client.get(f"/store/{created_store_id}?{query}")
+        assert response.headers["X-Cache"] == "HIT", query
+        assert response.json == {"id": created_store_id, "name": "Test Store"}
+
+
+def test_get_store_not_cached_when_invalidated_meanwhile(app, client, created_store_id):
+    with app.app_context():
+        engine = db.engine
+
+    def concurrent_write(*args):
+        # As if another request wrote the store while this one read it
+        response_cache.invalidate(f"store:{created_store_id}")
+
+    event.listen(engine, "after_cursor_execute", concurrent_write, once=True)
+    client.get(f"/store/{created_store_id}")
+
+    assert client.get(f"/store/{created_store_id}").headers["X-Cache"] == "MISS"
+
+
+def test_get_store_cache_invalidated_by_new_tag(client, created_store_id):
+    client.get(f"/store/{created_store_id}")
+    client.get(f"/store/{created_store_id}/tag")
+    client.post(
+        f"/store/{created_store_id}/tag",
+        json={"name": "Test Tag"},
+    )
+
+    response = client.get(f"/store/{created_store_id}")
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json["tags"] == [{"id": 1, "name": "Test Tag"}]
+
+    response = client.get(f"/store/{created_store_id}/tag")
+    assert response.headers["X-Cache"] == "MISS"
+    assert len(response.json) == 1
+
+
+def test_delete_store(client, jwt, create_catalog, count_queries):
+    create_catalog(store_count=2, item_count=20)
+    # Link an item of store 2 to the tag of store 1
+    client.post("/item/21/tag/1")
+
+    with count_queries() as statements:
+        response = client.delete("/store/1")
+
+    assert response.status_code == 200
+    assert client.get("/store/1").status_code == 404
+    assert client.get("/tag/1").status_code == 404
+    response = client.get("/item", headers={"Authorization": f"Bearer {jwt}"})
+    assert {item["store"]["id"] for item in response.json} == {2}
+    response = client.get(
+        "/item/21?fields=id&expand=tags", headers={"Authorization": f"Bearer {jwt}"}
+    )
+    assert response.json == {"id": 21, "tags": [{"id": 2, "name": "Tag 1"}]}
+    # Independent of the number of items: lookups, touches and deletes
+    assert len(statements) == 11
+
+
+def test_delete_store_in_chunks(app, client, create_catalog, count_queries):
+    create_catalog(store_count=1, item_count=5)
+
+    with app.app_context():
+        delete_store_rows(1, chunk_size=2)
+
+    assert client.get("/store/1").status_code == 404
+    with app.app_context():
+        assert db.session.query(ItemModel).count() == 0
+        assert db.session.query(ItemTags).count() == 0
+
+
+def test_delete_large_store_enqueues_one_job(app, client, fake_jobs, created_item_id, created_store_id):
+    app.config["STORE_DELETE_ASYNC_THRESHOLD"] = 0
+    jobs = fake_jobs("resources.store")
+
+    first = client.delete(f"/store/{created_store_id}")
+    second = client.delete(f"/store/{created_store_id}")
+
+    assert first.status_code == second.status_code == 202
+    assert first.json["job_id"] == second.json["job_id"] == f"delete-store-{created_store_id}"
+    assert list(jobs) == [f"delete-store-{created_store_id}"]
+
+
+def test_delete_large_store_restarts_failed_job(app, client, fake_jobs, created_item_id, created_store_id):
+    app.config["STORE_DELETE_ASYNC_THRESHOLD"] = 0
+    job_id = f"delete-store-{created_store_id}"
+    jobs = fake_jobs("resources.store", (job_id, "tasks.delete_store", "failed"))
+
+    response = client.delete(f"/store/{created_store_id}")
+
+    assert response.status_code == 202
+    assert jobs[job_id].get_status() == "queued"
+
+
+def test_store_deletion_status(client, jwt, fake_jobs):
+    fake_jobs(
+        "resources.store",
+        ("delete-store-1", "tasks.delete_store", "started"),
+        ("email-1", "tasks.send_user_registration_email", "queued"),
+    )
+    headers = {"Authorization": f"Bearer {jwt}"}
+
+    assert client.get("/store/deletion/delete-store-1").status_code == 401
+    response = client.get("/store/deletion/delete-store-1", headers=headers)
+    assert response.json == {"job_id": "delete-store-1", "status": "started"}
+    assert client.get("/store/deletion/email-1", headers=headers).status_code == 404
+    assert client.get("/store/deletion/missing", headers=headers).status_code == 404
@@ -0,0 +1,207 @@
+from sqlalchemy import event, insert
+
+from cache import response_cache
+from db import db
+from models import ItemTags
+
+
+def test_get_tags_in_store_query_count(client, create_catalog, count_queries):
+    create_catalog(store_count=1, item_count=10)
+    with count_queries() as statements:
+        response = client.get("/store/1/tag")
+
+    assert response.status_code == 200
+    assert len(response.json[0]["items"]) == 10
+    assert response.json[0]["store"] == {"id": 1, "name": "Store 0"}
+    # version, store, tags, items
+    assert len(statements) == 4
+
+
+def test_get_tag_query_count(client, create_catalog, count_queries):
+    create_catalog(store_count=1, item_count=10)
+    with count_queries() as statements:
+        response = client.get("/tag/1")
+
+    assert response.status_code == 200
+    assert len(response.json["items"]) == 10
+    # version, tag joined with its store, then items
+    assert len(statements) == 3
+
+
+def test_get_tag_expand_store(client, create_catalog, count_queries):
+    create_catalog(store_count=1, item_count=10)
+    with count_queries() as statements:
+        response = client.get("/tag/1?expand=store")
+
+    assert response.status_code == 200
+    assert response.json == {"id": 1, "name": "Tag 0", "store": {"id": 1, "name": "Store 0"}}
+    assert len(statements) == 2
+
+
+def test_get_tags_in_store_sparse_fields(client, create_catalog):
+    create_catalog(store_count=1, item_count=1)
+    response = client.get("/store/1/tag?fields=name")
+
+    assert response.status_code == 200
+    assert response.json == [{"name": "Tag 0"}]
+
+
+def test_get_tag_etag_changes_when_item_deleted(
+    client, admin_jwt, created_item_id, created_tag_id
+):
+    client.post(f"/item/{created_item_id}/tag/{created_tag_id}")
+    etag = client.get(f"/tag/{created_tag_id}").headers["ETag"]
+
+    client.delete(
+        f"/item/{created_item_id}",
+        headers={"Authorization": f"Bearer {admin_jwt}"},
+    )
+    response = client.get(
+        f"/tag/{created_tag_id}",
+        headers={"If-None-Match": etag},
+    )
+
+    assert response.status_code == 200
+    assert response.json["items"] == []
+
+
+def test_get_tag_cache_invalidated_by_link(
+    client, jwt, created_item_id, created_tag_id
+):
+    headers = {"Authorization": f"Bearer {jwt}"}
+    client.get(f"/tag/{created_tag_id}")
+    client.get(f"/item/{created_item_id}", headers=headers)
+    client.post(f"/item/{created_item_id}/tag/{created_tag_id}")
+
+    response = client.get(f"/tag/{created_tag_id}")
+    assert response.headers["X-Cache"] == "MISS"
+    assert [item["id"] for item in response.json["items"]] == [created_item_id]
+
+    response = client.get(f"/item/{created_item_id}", headers=headers)
+    assert response.headers["X-Cache"] == "MISS"
+    assert [tag["id"] for tag in response.json["tags"]] == [created_tag_id]
+
+
+def test_cache_stats(app, client, created_tag_id):
+    client.get(f"/tag/{created_tag_id}")
+    client.get(f"/tag/{created_tag_id}")
+    client.get(f"/tag/{created_tag_id}?fields=name")
+
+    with app.app_context():
+        assert response_cache.stats["Tags.Tag", "hit"] == 1
+        assert response_cache.stats["Tags.Tag", "miss"] == 2
+
+
+def _create_tags(client, store_id, count):
+    return [
+        client.post(f"/store/{store_id}/tag", json={"name": f"Tag {i}"}).json["id"]
+        for i in range(count)
+    ]
+
+
+def test_link_tags_to_item(client, jwt, created_item_id, created_store_id, count_queries):
+    tag_ids = _create_tags(client, created_store_id, 30)
+    with count_queries() as statements:
+        response = client.post(f"/item/{created_item_id}/tags", json={"tag_ids": tag_ids})
+
+    assert response.status_code == 200
+    assert response.json == {"tag_ids": tag_ids}
+    # item, tags, current links, insert, touch item, touch tags
+    assert len(statements) == 6
+    tags = client.get(
+        f"/item/{created_item_id}?fields=id&expand=tags",
+        headers={"Authorization": f"Bearer {jwt}"},
+    ).json["tags"]
+    assert [tag["id"] for tag in tags] == tag_ids
+
+
+def test_link_tags_to_item_keeps_existing(client, created_item_id, created_store_id):
+    tag_ids = _create_tags(client, created_store_id, 3)
+    client.post(f"/item/{created_item_id}/tags", json={"tag_ids": tag_ids[:2]})
+
+    response = client.post(f"/item/{created_item_id}/tags", json={"tag_ids": tag_ids[1:]})
+
+    assert response.json == {"tag_ids": tag_ids}
+
+
+def test_replace_item_tags(client, created_item_id, created_store_id):
+    tag_ids = _create_tags(client, created_store_id, 3)
+    client.post(f"/item/{created_item_id}/tags", json={"tag_ids": tag_ids[:2]})
+
+    response = client.put(f"/item/{created_item_id}/tags", json={"tag_ids": tag_ids[1:]})
+
+    assert response.json == {"tag_ids": tag_ids[1:]}
+    assert client.get(f"/tag/{tag_ids[0]}").json["items"] == []
+
+
+def test_unlink_tags_from_item(client, created_item_id, created_store_id):
+    tag_ids = _create_tags(client, created_store_id, 3)
+    client.post(f"/item/{created_item_id}/tags", json={"tag_ids": tag_ids})
+
+    response = client.delete(f"/item/{created_item_id}/tags", json={"tag_ids": tag_ids[:2]})
+
+    assert response.json == {"tag_ids": tag_ids[2:]}
+
+
+def test_link_tags_to_item_added_concurrently(app, client, created_item_id, created_tag_id):
+    def link_after_reading_links(state):
+        # Another request adds the link between our read and our insert
+        if state.is_select and state.statement.column_descriptions[0]["entity"] is ItemTags:
+            links = state.invoke_statement().freeze()
+            state.session.execute(insert(ItemTags).values(item_id=created_item_id, tag_id=created_tag_id))
+            return links()
+
+    with app.app_context():
+        event.listen(db.session, "do_orm_execute", link_after_reading_links)
+        try:
+            response = client.post(f"/item/{created_item_id}/tags", json={"tag_ids": [created_tag_id]})
+        finally:
+            event.remove(db.session, "do_orm_execute", link_after_reading_links)
+
+    assert response.status_code == 200
+    assert response.json == {"tag_ids": [created_tag_id]}
+    with app.app_context():
+        assert db.session.query(ItemTags).count() == 1
+
+
+def test_link_unknown_tags_to_item(client, created_item_id, created_tag_id):
+    response = client.post(
+        f"/item/{created_item_id}/tags", json={"tag_ids": [created_tag_id, 98, 99]}
+    )
+
+    assert response.status_code == 404
+    assert response.json["message"] == "Tags not found: 98, 99."
+
+
+def test_delete_tag(client, created_store_id, created_tag_id, count_queries):
+    with count_queries() as statements:
+        response = client.delete(f"/tag/{created_tag_id}")
+
+    assert response.status_code == 202
+    assert response.json == {"message": "Tag deleted."}
+    # guarded delete, touch the store
+    assert len(statements) == 2
+    assert "NOT (EXISTS" in statements[0]
+    assert client.get(f"/tag/{created_tag_id}").status_code == 404
+
+
+def test_delete_tag_not_found(client):
+    response = client.delete("/tag/1")
+
+    assert response.status_code == 404
+
+
+def test_delete_tag_cost_independent_of_items(client, create_catalog, count_queries):
+    """Benchmark: refusing to delete a tag costs the same for 1 or 200 items."""
+    create_catalog(store_count=1, item_count=1)
+    create_catalog(store_count=1, item_count=200)
+
+    statement_counts = []
+    for tag_id in (1, 2):
+        with count_queries() as statements:
+            response = client.delete(f"/tag/{tag_id}")
+        assert response.status_code == 400
+        statement_counts.append(len(statements))
+
+    # guarded delete, then the tag lookup telling 404 from 400
+    assert statement_counts == [2, 2]
@@ -0,0 +1,268 @@
+from flask_jwt_extended import create_access_token, decode_token
+from passlib.hash import pbkdf2_sha256
+
+from db import db
+from models import RoleModel, UserModel
+from passwords import hash_password
+
+
+def test_logout_user(client, jwt):
+    response = client.post(
+        "/logout",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+
+    assert response.status_code == 200
+    assert response.json["message"] == "Successfully logged out."
+
+
+def test_logout_user_twice(client, jwt):
+    client.post(
+        "/logout",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+    response = client.post(
+        "/logout",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+
+    assert response.status_code == 401
+    assert response.json == {
+        "description": "The token has been revoked.",
+        "error": "token_revoked",
+    }
+
+
+def test_logout_does_not_revoke_other_tokens(client, jwt, fresh_jwt):
+    client.post(
+        "/logout",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+    response = client.post(
+        "/logout",
+        headers={"Authorization": f"Bearer {fresh_jwt}"},
+    )
+
+    assert response.status_code == 200
+
+
+def test_blocklist_filter_skips_backend_for_valid_tokens(client, app, jwt, admin_jwt):
+    client.post(
+        "/logout",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+    client.post(
+        "/logout",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+    response = client.get(
+        "/blocklist/metrics",
+        headers={"Authorization": f"Bearer {admin_jwt}"},
+    )
+
+    assert response.status_code == 200
+    # The first logout and the metrics request were answered by the filter alone
+    assert response.json["lookups_filtered"] == 2
+    assert response.json["lookups_revoked"] == 1
+    assert response.json["filter_items"] == 1
+
+
+def test_blocklist_metrics_requires_admin(client, app, user_id):
+    with app.app_context():
+        access_token = create_access_token(
+            identity=user_id, additional_claims={"is_admin": False}
+        )
+
+    response = client.get(
+        "/blocklist/metrics",
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+
+    assert response.status_code == 401
+    assert response.json["message"] == "Admin privilege required."
+
+
+def test_logout_all_revokes_every_token(client, jwt, fresh_jwt):
+    response = client.post(
+        "/logout/all",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+    assert response.status_code == 200
+
+    response = client.post(
+        "/logout",
+        headers={"Authorization": f"Bearer {fresh_jwt}"},
+    )
+    assert response.status_code == 401
+    assert response.json["error"] == "token_revoked"
+
+
+def test_logout_all_keeps_new_tokens(client, app, jwt, user_id):
+    client.post(
+        "/logout/all",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+    with app.app_context():
+        access_token = create_access_token(
+            identity=user_id, additional_claims={"token_version": 1}
+        )
+
+    response = client.post(
+        "/logout",
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    assert response.status_code == 200
+
+
+def test_delete_user_revokes_tokens(client, jwt, user_id):
+    client.delete(f"/user/{user_id}")
+
+    response = client.post(
+        "/logout",
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+    assert response.status_code == 401
+
+
+def test_login_user(client, app):
+    with app.app_context():
+        db.session.add(
+            UserModel(username="jose", email="jose@example.com", password=hash_password("1234"))
+        )
+        db.session.commit()
+
+    response = client.post("/login", json={"username": "jose", "password": "1234"})
+
+    assert response.status_code == 200
+    assert response.json["access_token"]
+    assert response.json["refresh_token"]
+
+
+def test_login_user_invalid_password(client, app):
+    with app.app_context():
+        db.session.add(
+            UserModel(username="jose", email="jose@example.com", password=hash_password("1234"))
+        )
+        db.session.commit()
+
+    response = client.post("/login", json={"username": "jose", "password": "wrong"})
+
+    assert response.status_code == 401
+
+
+def test_login_upgrades_outdated_hash(client, app):
+    with app.app_context():
+        old_hash = pbkdf2_sha256.using(rounds=1000).hash("1234")
+        db.session.add(UserModel(username="jose", email="jose@example.com", password=old_hash))
+        db.session.commit()
+    app.config["PASSWORD_ROUNDS"] = 2000
+
+    response = client.post("/login", json={"username": "jose", "password": "1234"})
+
+    assert response.status_code == 200
+    with app.app_context():
+        user = UserModel.query.filter_by(username="jose").one()
+        assert user.password != old_hash
+        assert pbkdf2_sha256.from_string(user.password).rounds == 2000
+
+
+def test_calibrate_password_hashing(app):
+    result = app.test_cli_runner().invoke(args=["calibrate-password-hashing", "--target-ms", "5"])
+
+    assert result.exit_code == 0
+    assert "PASSWORD_ROUNDS=" in result.output
+
+
+def test_set_user_roles(client, app, admin_jwt, user_id):
+    with app.app_context():
+        db.session.add(RoleModel(name="admin"))
+        db.session.commit()
+
+    response = client.put(
+        f"/user/{user_id}/roles",
+        json={"roles": ["admin"]},
+        headers={"Authorization": f"Bearer {admin_jwt}"},
+    )
+
+    assert response.status_code == 200
+    assert response.json == {"id": user_id, "username": "test", "roles": ["admin"]}
+    with app.app_context():
+        access_token = create_access_token(identity=user_id)
+        assert decode_token(access_token)["is_admin"] is True
+
+
+def test_set_user_roles_unknown_role(client, admin_jwt, user_id):
+    response = client.put(
+        f"/user/{user_id}/roles",
+        json={"roles": ["owner"]},
+        headers={"Authorization": f"Bearer {admin_jwt}"},
+    )
+
+    assert response.status_code == 422
+    assert response.json["message"] == "Unknown roles: owner."
+
+
+def test_claims_cached_between_tokens(app, user_id, count_queries):
+    with app.app_context():
+        create_access_token(identity=str(user_id))
+        with count_queries() as statements:
+            access_token = create_access_token(identity=str(user_id))
+
+        assert statements == []
+        assert decode_token(access_token)["roles"] == []
+
+
+def test_additional_claims_do_not_leak_into_later_tokens(app, user_id):
+    with app.app_context():
+        create_access_token(identity=str(user_id), additional_claims={"is_admin": True})
+        access_token = create_access_token(identity=str(user_id))
+
+        assert decode_token(access_token)["is_admin"] is False
+
+
+def test_register_user(client, monkeypatch, count_queries):
+    enqueued = []
+    monkeypatch.setattr("resources.user.queue_registration_email", lambda *args: enqueued.append(args))
+
+    with count_queries() as statements:
+        response = client.post(
+            "/register",
+            json={"username": "jose", "email": "jose@example.com", "password": "1234"},
+        )
+
+    assert response.status_code == 201
+    assert enqueued[0][1:] == ("jose@example.com", "jose")
+    # availability probe, insert
+    assert len(statements) == 2
+
+
+def test_register_taken_username_skips_hashing(client, user_id, monkeypatch):
+    def hash_password(password):
+        raise AssertionError("Hashed a password for a taken username.")
+
+    monkeypatch.setattr("resources.user.hash_password", hash_password)
+
+    response = client.post(
+        "/register",
+        json={"username": "test", "email": "other@example.com", "password": "1234"},
+    )
+
+    assert response.status_code == 409
+
+
+def test_register_race_returns_conflict(client, app, monkeypatch):
+    def hash_password(password):
+        # Another request registers the same username in the meantime
+        db.session.add(UserModel(username="jose", email="first@example.com", password="x"))
+        db.session.commit()
+        return "hash"
+
+    monkeypatch.setattr("resources.user.hash_password", hash_password)
+
+    response = client.post(
+        "/register",
+        json={"username": "jose", "email": "jose@example.com", "password": "1234"},
+    )
+
+    assert response.status_code == 409
+    assert response.json["message"] == "A user with that username or email already exists."
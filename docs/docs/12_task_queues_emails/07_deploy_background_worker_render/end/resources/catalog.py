@@ -0,0 +1,141 @@
+import io
+import uuid
+
+import redis
+from flask import Response, current_app, request, stream_with_context
+from flask.views import MethodView
+from flask_jwt_extended import get_jwt, jwt_required
+from flask_smorest import Blueprint, abort
+from rq import Queue
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+from sqlalchemy.exc import IntegrityError
+
+from catalog import (
+    MIMETYPES,
+    READERS,
+    RECORD_TYPES,
+    WRITERS,
+    CatalogFormatError,
+    export_records,
+    import_records,
+)
+from db import db
+from schemas import CatalogFormatSchema, CatalogImportResultSchema, IngestJobSchema
+from settings import REDIS_URL
+
+blp = Blueprint("Catalog", "catalog", description="Export and import of the whole catalog")
+connection = redis.from_url(REDIS_URL)
+queue = Queue("ingest", connection=connection)
+INGEST_PAYLOAD_PREFIX = "ingest-payload:"
+
+
+def require_admin():
+    if not get_jwt().get("is_admin"):
+        abort(401, message="Admin privilege required.")
+
+
+def request_format(format_args):
+    if request.mimetype == MIMETYPES["csv"]:
+        return "csv"
+    return format_args["format"]
+
+
+def copy_payload(key, max_bytes, ttl):
+    """Append the request body to `key` in chunks.
+
+    The TTL is set with the first chunk, so an upload cut short is dropped even
+    if this process dies before cleaning it up.
+    """
+    size = 0
+    while chunk := request.stream.read(1024 * 1024):
+        size += len(chunk)
+        if size > max_bytes:
+            abort(413, message=f"Payloads are limited to {max_bytes} bytes.")
+        pipe = connection.pipeline()
+        pipe.append(key, chunk)
+        pipe.expire(key, ttl)
+        pipe.execute()
+
+
+@blp.route("/export")
+class CatalogExport(MethodView):
+    @jwt_required()
+    @blp.arguments(CatalogFormatSchema, location="query")
+    def get(self, format_args):
+        require_admin()
+        file_format = format_args["format"]
+        return Response(
+            stream_with_context(WRITERS[file_format](export_records())),
+            mimetype=MIMETYPES[file_format],
+        )
+
+
+@blp.route("/import")
+class CatalogImport(MethodView):
+    @jwt_required()
+    @blp.arguments(CatalogFormatSchema, location="query")
+    @blp.response(201, CatalogImportResultSchema)
+    def post(self, format_args):
+        require_admin()
+        file_format = request_format(format_args)
+
+        # Parsed as it arrives rather than read into memory first
+        lines = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+        try:
+            counts = import_records(READERS[file_format](lines))
+        except CatalogFormatError as e:
+            db.session.rollback()
+            abort(400, message=str(e))
+        except IntegrityError:
+            db.session.rollback()
+            abort(
+                409,
+                message="The import conflicts with existing rows. Import into an empty database.",
+            )
+
+        return {f"{record_type}s": counts[record_type] for record_type in RECORD_TYPES}
+
+
+@blp.route("/ingest")
+class CatalogIngest(MethodView):
+    @jwt_required()
+    @blp.arguments(CatalogFormatSchema, location="query")
+    @blp.response(202, IngestJobSchema)
+    def post(self, format_args):
+        """Import a catalog in the background, like POST /import."""
+        require_admin()
+        file_format = request_format(format_args)
+        max_bytes = current_app.config["INGEST_MAX_BYTES"]
+
+        # Copied to Redis in chunks, for the worker to read back the same way
+        key = INGEST_PAYLOAD_PREFIX + uuid.uuid4().hex
+        try:
+            copy_payload(key, max_bytes, current_app.config["INGEST_PAYLOAD_TTL"])
+        except BaseException:
+            connection.delete(key)
+            raise
+
+        job = queue.enqueue("tasks.ingest_catalog", key, file_format, job_timeout="1h")
+        return {"job_id": job.id, "status": job.get_status(), "errors": []}
+
+
+@blp.route("/ingest/<string:job_id>")
+class CatalogIngestStatus(MethodView):
+    @jwt_required()
+    @blp.response(200, IngestJobSchema)
+    def get(self, job_id):
+        require_admin()
+        try:
+            job = Job.fetch(job_id, connection=connection)
+        except NoSuchJobError:
+            abort(404, message="Ingest job not found.")
+        if job.func_name != "tasks.ingest_catalog":
+            abort(404, message="Ingest job not found.")
+
+        return {
+            "job_id": job.id,
+            "status": job.get_status(),
+            "counts": job.meta.get("counts", {}),
+            "errors": job.meta.get("errors", []),
+        }
@@ -1,22 +1,108 @@
+from flask import current_app
 from flask.views import MethodView
-from flask_smorest import Blueprint, abort
+from flask_smorest import abort
 from flask_jwt_extended import jwt_required, get_jwt
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import String, cast, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import joinedload, selectinload
 
-from db import db
-from models import ItemModel
-from schemas import ItemSchema, ItemUpdateSchema
+from cache import keys_showing_item, response_cache
+from conditional import catalog_version, conditional, latest
+from db import db, upsert_insert
+from fieldsets import fieldset_args
+from idempotency import idempotent
+from models import ItemModel, ItemTags, StoreModel, TagModel
+from models.timestamp import utcnow
+from pagination import Blueprint
+from schemas import (
+    ItemBulkArgsSchema,
+    ItemBulkResultSchema,
+    ItemBulkSchema,
+    ItemRowSchema,
+    ItemSchema,
+    ItemUpdateSchema,
+)
+from streaming import StreamArgsSchema, stream_query, wants_stream
 
 blp = Blueprint("Items", __name__, description="Operations on items")
 
+# ItemSchema nests the store and the tags of each item. Load the store in the
+# same query (many-to-one) and the tags in one extra IN query for all items.
+ITEM_LOADERS = {
+    "store": joinedload(ItemModel.store),
+    "tags": selectinload(ItemModel.tags),
+}
+ItemFieldsetArgs = fieldset_args(ItemSchema, ItemModel, ITEM_LOADERS)
+
+
+def item_version(item_id):
+    tags_updated = (
+        db.session.query(func.max(TagModel.updated_at))
+        .join(ItemTags, ItemTags.tag_id == TagModel.id)
+        .filter(ItemTags.item_id == item_id)
+        .scalar_subquery()
+    )
+    row = (
+        db.session.query(ItemModel.updated_at, StoreModel.updated_at, tags_updated)
+        .outerjoin(StoreModel, ItemModel.store_id == StoreModel.id)
+        .filter(ItemModel.id == item_id)
+        .first()
+    )
+    return None if row is None else (latest(*row),)
+
+
+ITEM_ROW_COLUMNS = (ItemModel.id, ItemModel.name, ItemModel.price, ItemModel.store_id)
+
+
+def _tag_cache_keys(item_id):
+    """Column with the cache keys of the item's tags, comma separated."""
+    keys = (
+        literal("tag:")
+        + cast(TagModel.id, String)
+        + literal(",store_tags:")
+        + cast(TagModel.store_id, String)
+    )
+    # One table per FROM: RETURNING renders the column names unqualified
+    tag_ids = select(ItemTags.tag_id).where(ItemTags.item_id == item_id)
+    return (
+        select(func.aggregate_strings(keys, ","))
+        .where(TagModel.id.in_(tag_ids))
+        .scalar_subquery()
+        .label("tag_keys")
+    )
+
+
+def _touch_previous_store(item_id, store_id, now):
+    """Touch the store the item is leaving, if any, and return its id.
+
+    The item's row is locked (the database's write lock on SQLite), so a
+    concurrent PUT moving the same item waits and then sees this move.
+    """
+    previous_store_id = (
+        select(ItemModel.store_id)
+        .where(ItemModel.id == item_id)
+        .with_for_update()
+        .scalar_subquery()
+    )
+    return db.session.scalar(
+        update(StoreModel)
+        .where(StoreModel.id == previous_store_id, StoreModel.id != store_id)
+        .values(updated_at=now)
+        .returning(StoreModel.id)
+        .execution_options(synchronize_session=False)
+    )
+
 
 @blp.route("/item/<int:item_id>")
 class Item(MethodView):
     @jwt_required()
+    @response_cache.cached("item:{item_id}", ItemFieldsetArgs)
+    @conditional(blp, item_version)
+    @blp.arguments(ItemFieldsetArgs, location="query")
     @blp.response(200, ItemSchema)
-    def get(self, item_id):
-        item = ItemModel.query.get_or_404(item_id)
-        return item
+    def get(self, fieldset, item_id):
+        item = ItemModel.query.options(*fieldset.query_options()).get_or_404(item_id)
+        return fieldset.response(item)
 
     @jwt_required()
     def delete(self, item_id):
@@ -25,22 +111,66 @@ class Item(MethodView):
             abort(401, message="Admin privilege required.")
             
         item = ItemModel.query.get_or_404(item_id)
+        # The store and tags list this item, so their representations change
+        if item.store:
+            item.store.touch()
+        for tag in item.tags:
+            tag.touch()
+        stale_keys = keys_showing_item(item)
         db.session.delete(item)
         db.session.commit()
+        response_cache.invalidate(*stale_keys)
         return {"message": "Item deleted."}
 
     @blp.arguments(ItemUpdateSchema)
-    @blp.response(200, ItemSchema)
+    @blp.response(200, ItemRowSchema)
     def put(self, item_data, item_id):
-        item = ItemModel.query.get(item_id)
-        if item:
-            item.price = item_data["price"]
-            item.name = item_data["name"]
-        else:
-            item = ItemModel(id=item_id, **item_data)
-        
-        db.session.add(item)
-        db.session.commit()
+        """Create or update an item in one statement.
+
+        Only the fields sent are changed. Creating an item needs all of them.
+        When a `store_id` is sent, one more statement touches the store the
+        item leaves.
+        """
+        values = {**item_data, "updated_at": utcnow()}
+        stale_keys = {f"item:{item_id}"}
+
+        try:
+            if "store_id" in values:
+                # The item may be moving, the previous store's listing changes too
+                previous_store_id = _touch_previous_store(
+                    item_id, values["store_id"], values["updated_at"]
+                )
+                if previous_store_id is not None:
+                    stale_keys.add(f"store:{previous_store_id}")
+
+            if item_data.keys() >= {"name", "price", "store_id"}:
+                statement = upsert_insert(ItemModel).values(id=item_id, **values)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[ItemModel.id], set_=values
+                )
+            else:
+                # Without every field this can only be an update
+                statement = (
+                    update(ItemModel)
+                    .where(ItemModel.id == item_id)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+            row = db.session.execute(
+                statement.returning(*ITEM_ROW_COLUMNS, _tag_cache_keys(item_id))
+            ).mappings().first()
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            abort(422, message="Store not found.")
+
+        if row is None:
+            abort(422, message="Creating an item requires a name, price and store_id.")
+        item = {column.key: row[column.key] for column in ITEM_ROW_COLUMNS}
+        stale_keys.add(f"store:{item['store_id']}")
+        if row["tag_keys"]:
+            stale_keys.update(row["tag_keys"].split(","))
+        response_cache.invalidate(*stale_keys)
 
         return item
 
@@ -48,11 +178,21 @@ class Item(MethodView):
 @blp.route("/item")
 class ItemList(MethodView):
     @jwt_required()
+    @conditional(blp, lambda: catalog_version(ItemModel), last_modified=False)
+    @blp.arguments(ItemFieldsetArgs, location="query")
+    @blp.arguments(StreamArgsSchema, location="query")
     @blp.response(200, ItemSchema(many=True))
-    def get(self):
-        return ItemModel.query.all()
+    @blp.paginate()
+    def get(self, fieldset, stream_args, pagination_parameters):
+        query = ItemModel.query.options(*fieldset.query_options())
+        if wants_stream(stream_args):
+            return stream_query(query.order_by(ItemModel.id), fieldset.schema())
+
+        items = pagination_parameters.paginate_query(query, ItemModel.id)
+        return fieldset.response(items, many=True)
 
     @jwt_required(fresh=True)
+    @idempotent
     @blp.arguments(ItemSchema)
     @blp.response(201, ItemSchema)
     def post(self, item_data):
@@ -63,5 +203,85 @@ class ItemList(MethodView):
             db.session.commit()
         except SQLAlchemyError:
             abort(500, message="An error occurred whilte inserting the item.")
+        response_cache.invalidate(*keys_showing_item(item))
+
+        return item
+
+
+def _check_bulk_stores(loaded, errors):
+    """Add an error to every otherwise valid row whose store doesn't exist."""
+    store_ids = {row["store_id"] for index, row in enumerate(loaded) if index not in errors}
+    existing = {
+        store_id
+        for (store_id,) in db.session.query(StoreModel.id).filter(StoreModel.id.in_(store_ids))
+    }
+    for index, row in enumerate(loaded):
+        if index not in errors and row["store_id"] not in existing:
+            errors[index] = {"store_id": ["Store not found."]}
+
+
+def _insert_bulk_items(valid, batch_size, atomic, errors, results):
+    """Insert `(index, row)` pairs, recording each row's id or error in `results`.
+
+    Without `atomic`, a failed batch is reported in `errors` and the others are
+    kept. The caller commits.
+    """
+    statement = insert(ItemModel).returning(ItemModel.id, sort_by_parameter_order=True)
+    for start in range(0, len(valid), batch_size):
+        batch = valid[start : start + batch_size]
+        try:
+            if atomic:
+                ids = db.session.scalars(statement, [row for _, row in batch]).all()
+            else:
+                # A failed batch only rolls back to here
+                with db.session.begin_nested():
+                    ids = db.session.scalars(statement, [row for _, row in batch]).all()
+        except SQLAlchemyError:
+            if atomic:
+                db.session.rollback()
+                abort(500, message="An error occurred while inserting the items.")
+            for index, _ in batch:
+                errors[index] = {"_schema": ["The item could not be inserted."]}
+                results[index] = {"index": index, "errors": errors[index]}
+            continue
+
+        for (index, _), item_id in zip(batch, ids):
+            results[index] = {"index": index, "id": item_id}
+
+
+@blp.route("/item/bulk")
+class ItemBulk(MethodView):
+    @jwt_required(fresh=True)
+    @blp.arguments(ItemBulkArgsSchema, location="query")
+    @blp.arguments(ItemBulkSchema)
+    @blp.response(201, ItemBulkResultSchema)
+    @blp.alt_response(207, schema=ItemBulkResultSchema, description="Some items were not created.")
+    @blp.alt_response(422, schema=ItemBulkResultSchema, description="No items were created.")
+    def post(self, bulk_args, bulk_data):
+        """Create many items in one transaction.
+
+        The body is a JSON array of items. With `atomic` (the default) a single
+        invalid item fails the whole request; otherwise the valid items are
+        created and the others reported. Rows are inserted `batch_size` at a
+        time with multi-row INSERT ... RETURNING statements.
+        """
+        loaded, errors = bulk_data["items"], bulk_data["errors"]
+        max_rows = current_app.config["ITEM_BULK_MAX_ROWS"]
+        if len(loaded) > max_rows:
+            abort(413, message=f"At most {max_rows} items per request.")
+
+        _check_bulk_stores(loaded, errors)
+        results = {index: {"index": index, "errors": messages} for index, messages in errors.items()}
+        if errors and bulk_args["atomic"]:
+            return {"created": 0, "results": [results[index] for index in sorted(results)]}, 422
+
+        valid = [(index, row) for index, row in enumerate(loaded) if index not in errors]
+        batch_size = bulk_args.get("batch_size") or current_app.config["ITEM_BULK_BATCH_SIZE"]
+        _insert_bulk_items(valid, batch_size, bulk_args["atomic"], errors, results)
+        db.session.commit()
+        response_cache.invalidate(*{f"store:{row['store_id']}" for _, row in valid})
 
-        return item
\ No newline at end of file
+        return {
+            "created": len(results) - len(errors),
+            "results": [results[index] for index in sorted(results)],
+        }, (207 if errors else 201)
@@ -1,38 +1,201 @@
 import uuid
-from flask import request
+import redis
+from flask import current_app, request
 from flask.views import MethodView
-from flask_smorest import Blueprint, abort
+from flask_smorest import abort
+from flask_jwt_extended import jwt_required
+from rq import Queue
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
 
+from sqlalchemy import delete, func, or_, select, update
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy.orm import selectinload
 
+from cache import response_cache
+from conditional import catalog_version, conditional, latest
 from db import db
-from models import StoreModel
+from fieldsets import fieldset_args
+from idempotency import idempotent
+from models import ItemModel, ItemTags, StoreModel, TagModel
+from models.timestamp import utcnow
+from pagination import Blueprint
 from schemas import StoreSchema
+from settings import REDIS_URL
+from streaming import StreamArgsSchema, stream_query, wants_stream
 
 
 blp = Blueprint("stores", __name__, description="Operations on stores")
+connection = redis.from_url(REDIS_URL)
+queue = Queue("default", connection=connection)
+
+# StoreSchema nests plain items and tags, so one IN query per collection
+# loads them for every store in the response.
+STORE_LOADERS = {
+    "items": selectinload(StoreModel.items),
+    "tags": selectinload(StoreModel.tags),
+}
+StoreFieldsetArgs = fieldset_args(StoreSchema, StoreModel, STORE_LOADERS)
+
+
+def store_version(store_id):
+    items_updated = (
+        db.session.query(func.max(ItemModel.updated_at))
+        .filter(ItemModel.store_id == store_id)
+        .scalar_subquery()
+    )
+    tags_updated = (
+        db.session.query(func.max(TagModel.updated_at))
+        .filter(TagModel.store_id == store_id)
+        .scalar_subquery()
+    )
+    row = (
+        db.session.query(StoreModel.updated_at, items_updated, tags_updated)
+        .filter(StoreModel.id == store_id)
+        .first()
+    )
+    return None if row is None else (latest(*row),)
+
+
+def _delete_in_chunks(model, ids, chunk_size):
+    """Delete the rows of `model` whose id is in the `ids` subquery."""
+    if chunk_size is None:
+        db.session.execute(delete(model).where(model.id.in_(ids)))
+        return
+
+    # Short transactions, so a huge store doesn't hold its locks for long
+    while True:
+        chunk = ids.limit(chunk_size)
+        result = db.session.execute(delete(model).where(model.id.in_(chunk)))
+        db.session.commit()
+        if result.rowcount < chunk_size:
+            return
+
+
+def delete_store_rows(store_id, chunk_size=None):
+    """Delete a store with its items, tags and their links, set-based.
+
+    The number of statements doesn't depend on the size of the store, and no
+    row is loaded into the session. With `chunk_size`, links and items are
+    deleted and committed that many at a time (used by the background job).
+    """
+    store_items = select(ItemModel.id).where(ItemModel.store_id == store_id)
+    store_tags = select(TagModel.id).where(TagModel.store_id == store_id)
+    links = select(ItemTags.id).where(
+        or_(ItemTags.item_id.in_(store_items), ItemTags.tag_id.in_(store_tags))
+    )
+
+    # Items and tags of other stores linked to this store's lose a link
+    other_items = select(ItemTags.item_id).where(
+        ItemTags.tag_id.in_(store_tags), ItemTags.item_id.not_in(store_items)
+    )
+    other_tags = (
+        db.session.query(TagModel.id, TagModel.store_id)
+        .join(ItemTags, ItemTags.tag_id == TagModel.id)
+        .filter(ItemTags.item_id.in_(store_items), TagModel.store_id != store_id)
+        .distinct()
+        .all()
+    )
+
+    stale_keys = {f"store:{store_id}", f"store_tags:{store_id}"}
+    if response_cache.enabled:
+        stale_keys |= {f"item:{item_id}" for item_id in db.session.scalars(store_items)}
+        stale_keys |= {f"tag:{tag_id}" for tag_id in db.session.scalars(store_tags)}
+        stale_keys |= {f"item:{item_id}" for item_id in db.session.scalars(other_items)}
+    for tag_id, tag_store_id in other_tags:
+        stale_keys |= {f"tag:{tag_id}", f"store_tags:{tag_store_id}"}
+
+    now = utcnow()
+    db.session.execute(
+        update(ItemModel)
+        .where(ItemModel.id.in_(other_items))
+        .values(updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if other_tags:
+        db.session.execute(
+            update(TagModel)
+            .where(TagModel.id.in_([tag_id for tag_id, _ in other_tags]))
+            .values(updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+    # Explicit deletes rather than relying on ON DELETE CASCADE, as SQLite
+    # doesn't enforce foreign keys unless told to
+    _delete_in_chunks(ItemTags, links, chunk_size)
+    _delete_in_chunks(ItemModel, store_items, chunk_size)
+    db.session.execute(delete(TagModel).where(TagModel.store_id == store_id))
+    db.session.execute(delete(StoreModel).where(StoreModel.id == store_id))
+    db.session.commit()
+
+    response_cache.invalidate(*stale_keys)
 
 
 @blp.route("/store/<int:store_id>")
 class Store(MethodView):
+    @response_cache.cached("store:{store_id}", StoreFieldsetArgs)
+    @conditional(blp, store_version)
+    @blp.arguments(StoreFieldsetArgs, location="query")
     @blp.response(200, StoreSchema)
-    def get(self, store_id):
-        store = StoreModel.query.get_or_404(store_id)
-        return store
+    def get(self, fieldset, store_id):
+        store = StoreModel.query.options(*fieldset.query_options()).get_or_404(store_id)
+        return fieldset.response(store)
 
     def delete(self, store_id):
-        store = StoreModel.query.get_or_404(store_id)
-        db.session.delete(store)
-        db.session.commit()
+        if db.session.get(StoreModel, store_id) is None:
+            abort(404, message="Store not found.")
+
+        item_count = (
+            db.session.query(func.count(ItemModel.id))
+            .filter(ItemModel.store_id == store_id)
+            .scalar()
+        )
+        if item_count > current_app.config["STORE_DELETE_ASYNC_THRESHOLD"]:
+            # One job per store, repeated DELETEs get the pending one back
+            job_id = f"delete-store-{store_id}"
+            try:
+                job = Job.fetch(job_id, connection=connection)
+            except NoSuchJobError:
+                job = None
+            if job is None or job.is_finished or job.is_failed:
+                job = queue.enqueue("tasks.delete_store", store_id, job_id=job_id)
+            return {"message": "Store deletion started.", "job_id": job.id}, 202
+
+        delete_store_rows(store_id)
         return {"message": "Store deleted"}
 
 
+@blp.route("/store/deletion/<string:job_id>")
+class StoreDeletion(MethodView):
+    @jwt_required()
+    def get(self, job_id):
+        """Status of a store deletion running in the background."""
+        try:
+            job = Job.fetch(job_id, connection=connection)
+        except NoSuchJobError:
+            abort(404, message="Deletion job not found.")
+        # The queue's Redis holds other jobs too, don't tell about those
+        if job.func_name != "tasks.delete_store":
+            abort(404, message="Deletion job not found.")
+        return {"job_id": job.id, "status": job.get_status()}
+
+
 @blp.route("/store")
 class StoreList(MethodView):
+    @conditional(blp, lambda: catalog_version(StoreModel), last_modified=False)
+    @blp.arguments(StoreFieldsetArgs, location="query")
+    @blp.arguments(StreamArgsSchema, location="query")
     @blp.response(200, StoreSchema(many=True))
-    def get(self):
-        return StoreModel.query.all()
+    @blp.paginate()
+    def get(self, fieldset, stream_args, pagination_parameters):
+        query = StoreModel.query.options(*fieldset.query_options())
+        if wants_stream(stream_args):
+            return stream_query(query.order_by(StoreModel.id), fieldset.schema())
+
+        stores = pagination_parameters.paginate_query(query, StoreModel.id)
+        return fieldset.response(stores, many=True)
 
+    @idempotent
     @blp.arguments(StoreSchema)
     @blp.response(200, StoreSchema)
     def post(self, store_data):
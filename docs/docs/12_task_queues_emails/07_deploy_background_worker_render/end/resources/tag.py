@@ -1,22 +1,79 @@
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import delete, func, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import joinedload, selectinload
 
-from db import db
-from models import TagModel, StoreModel, ItemModel
-from schemas import TagSchema, TagAndItemSchema
+from cache import keys_showing_tag, response_cache
+from conditional import conditional, latest
+from db import db, upsert_insert
+from fieldsets import fieldset_args
+from idempotency import idempotent
+from models import TagModel, StoreModel, ItemModel, ItemTags
+from models.timestamp import utcnow
+from schemas import ItemTagIdsSchema, TagSchema, TagAndItemSchema
 
 blp = Blueprint("Tags", "tags", description="Operations on tags")
 
+# TagSchema nests the store and the items of each tag.
+TAG_LOADERS = {
+    "store": joinedload(TagModel.store),
+    "items": selectinload(TagModel.items),
+}
+TagFieldsetArgs = fieldset_args(TagSchema, TagModel, TAG_LOADERS)
+
+
+def tags_in_store_version(store_id):
+    tags_updated = (
+        db.session.query(func.max(TagModel.updated_at))
+        .filter(TagModel.store_id == store_id)
+        .scalar_subquery()
+    )
+    items_updated = (
+        db.session.query(func.max(ItemModel.updated_at))
+        .join(ItemTags, ItemTags.item_id == ItemModel.id)
+        .join(TagModel, TagModel.id == ItemTags.tag_id)
+        .filter(TagModel.store_id == store_id)
+        .scalar_subquery()
+    )
+    row = (
+        db.session.query(StoreModel.updated_at, tags_updated, items_updated)
+        .filter(StoreModel.id == store_id)
+        .first()
+    )
+    return None if row is None else (latest(*row),)
+
+
+def tag_version(tag_id):
+    items_updated = (
+        db.session.query(func.max(ItemModel.updated_at))
+        .join(ItemTags, ItemTags.item_id == ItemModel.id)
+        .filter(ItemTags.tag_id == tag_id)
+        .scalar_subquery()
+    )
+    row = (
+        db.session.query(TagModel.updated_at, StoreModel.updated_at, items_updated)
+        .outerjoin(StoreModel, TagModel.store_id == StoreModel.id)
+        .filter(TagModel.id == tag_id)
+        .first()
+    )
+    return None if row is None else (latest(*row),)
+
 
 @blp.route("/store/<int:store_id>/tag")
 class TagsInStore(MethodView):
+    @response_cache.cached("store_tags:{store_id}", TagFieldsetArgs)
+    @conditional(blp, tags_in_store_version)
+    @blp.arguments(TagFieldsetArgs, location="query")
     @blp.response(200, TagSchema(many=True))
-    def get(self, store_id):
-        store = StoreModel.query.get_or_404(store_id)
+    def get(self, fieldset, store_id):
+        store = StoreModel.query.options(
+            selectinload(StoreModel.tags).options(*fieldset.query_options())
+        ).get_or_404(store_id)
 
-        return store.tags.all()
+        return fieldset.response(store.tags, many=True)
 
+    @idempotent
     @blp.arguments(TagSchema)
     @blp.response(201, TagSchema)
     def post(self, tag_data, store_id):
@@ -30,6 +87,7 @@ class TagsInStore(MethodView):
                 500,
                 message=str(e)
             )
+        response_cache.invalidate(*keys_showing_tag(tag))
 
         return tag
 
@@ -42,12 +100,17 @@ class LinkTagsToItem(MethodView):
         tag = TagModel.query.get_or_404(tag_id)
 
         item.tags.append(tag)
+        item.touch()
+        tag.touch()
 
         try:
             db.session.add(item)
             db.session.commit()
         except SQLAlchemyError:
             abort(500, message="An error occurred while inserting the tag.")
+        response_cache.invalidate(
+            f"item:{item_id}", f"tag:{tag_id}", f"store_tags:{tag.store_id}"
+        )
         
         return tag
     
@@ -57,22 +120,144 @@ class LinkTagsToItem(MethodView):
         tag = TagModel.query.get_or_404(tag_id)
 
         item.tags.remove(tag)
+        item.touch()
+        tag.touch()
 
         try:
             db.session.add(item)
             db.session.commit()
         except SQLAlchemyError:
             abort(500, message="An error occurred while inserting the tag.")
+        response_cache.invalidate(
+            f"item:{item_id}", f"tag:{tag_id}", f"store_tags:{tag.store_id}"
+        )
 
         return {"message": "Item removed from tag", "item": item, "tag": tag}
 
 
+def _tag_changes(item_id, tag_ids, add, remove):
+    """Work out which links `update_item_tags` adds and removes.
+
+    Returns the tags linked now, the ones to link, the ones to unlink and the
+    store of each of those tags.
+    """
+    if db.session.query(ItemModel.id).filter(ItemModel.id == item_id).first() is None:
+        abort(404, message="Item not found.")
+
+    tag_ids = set(tag_ids)
+    tag_stores = dict(
+        db.session.query(TagModel.id, TagModel.store_id).filter(TagModel.id.in_(tag_ids))
+    )
+    unknown = tag_ids - tag_stores.keys()
+    if unknown:
+        abort(404, message=f"Tags not found: {', '.join(map(str, sorted(unknown)))}.")
+
+    current = {
+        tag_id
+        for (tag_id,) in db.session.query(ItemTags.tag_id).filter(ItemTags.item_id == item_id)
+    }
+    to_add = tag_ids - current if add else set()
+    if remove:
+        to_remove = current - tag_ids if add else current & tag_ids
+    else:
+        to_remove = set()
+
+    # Tags replaced away are not in the request, find their stores too
+    missing = to_remove - tag_stores.keys()
+    if missing:
+        tag_stores.update(
+            db.session.query(TagModel.id, TagModel.store_id).filter(TagModel.id.in_(missing))
+        )
+    return current, to_add, to_remove, tag_stores
+
+
+def _write_tag_changes(item_id, to_add, to_remove):
+    """Add and remove the links, touching the item and the tags, and commit."""
+    try:
+        if to_add:
+            # A concurrent request may have added the same links meanwhile
+            db.session.execute(
+                upsert_insert(ItemTags).on_conflict_do_nothing(
+                    index_elements=[ItemTags.item_id, ItemTags.tag_id]
+                ),
+                [{"item_id": item_id, "tag_id": tag_id} for tag_id in to_add],
+            )
+        if to_remove:
+            db.session.execute(
+                delete(ItemTags).where(
+                    ItemTags.item_id == item_id, ItemTags.tag_id.in_(to_remove)
+                )
+            )
+
+        # Both sides show the link, so both representations changed
+        now = utcnow()
+        changed = to_add | to_remove
+        db.session.execute(update(ItemModel).where(ItemModel.id == item_id).values(updated_at=now))
+        db.session.execute(update(TagModel).where(TagModel.id.in_(changed)).values(updated_at=now))
+        db.session.commit()
+    except IntegrityError:
+        # E.g. the item or a tag was deleted concurrently
+        db.session.rollback()
+        abort(409, message="The item or its tags changed concurrently, try again.")
+    except SQLAlchemyError:
+        db.session.rollback()
+        abort(500, message="An error occurred while updating the tags.")
+
+
+def update_item_tags(item_id, tag_ids, add=True, remove=False):
+    """Link and/or unlink tags of an item with set-based statements.
+
+    With `add`, links the given tags the item doesn't have yet. With `remove`
+    and `add`, unlinks every other tag (the tags are replaced); with `remove`
+    only, unlinks the given tags. Returns the tag ids linked afterwards.
+    """
+    current, to_add, to_remove, tag_stores = _tag_changes(item_id, tag_ids, add, remove)
+    changed = to_add | to_remove
+    if not changed:
+        return current
+
+    _write_tag_changes(item_id, to_add, to_remove)
+    response_cache.invalidate(
+        f"item:{item_id}",
+        *(f"tag:{tag_id}" for tag_id in changed),
+        *(f"store_tags:{tag_stores[tag_id]}" for tag_id in changed),
+    )
+    return (current | to_add) - to_remove
+
+
+@blp.route("/item/<int:item_id>/tags")
+class ItemTagList(MethodView):
+    @blp.arguments(ItemTagIdsSchema)
+    @blp.response(200, ItemTagIdsSchema)
+    def put(self, tag_data, item_id):
+        """Replace the tags of an item."""
+        tag_ids = update_item_tags(item_id, tag_data["tag_ids"], add=True, remove=True)
+        return {"tag_ids": sorted(tag_ids)}
+
+    @blp.arguments(ItemTagIdsSchema)
+    @blp.response(200, ItemTagIdsSchema)
+    def post(self, tag_data, item_id):
+        """Link tags to an item, keeping its other tags."""
+        tag_ids = update_item_tags(item_id, tag_data["tag_ids"], add=True)
+        return {"tag_ids": sorted(tag_ids)}
+
+    @blp.arguments(ItemTagIdsSchema)
+    @blp.response(200, ItemTagIdsSchema)
+    def delete(self, tag_data, item_id):
+        """Unlink tags from an item."""
+        tag_ids = update_item_tags(item_id, tag_data["tag_ids"], add=False, remove=True)
+        return {"tag_ids": sorted(tag_ids)}
+
+
 @blp.route("/tag/<int:tag_id>")
 class Tag(MethodView):
+    @response_cache.cached("tag:{tag_id}", TagFieldsetArgs)
+    @conditional(blp, tag_version)
+    @blp.arguments(TagFieldsetArgs, location="query")
     @blp.response(200, TagSchema)
-    def get(self, tag_id):
-        tag = TagModel.query.get_or_404(tag_id)
-        return tag
+    def get(self, fieldset, tag_id):
+        tag = TagModel.query.options(*fieldset.query_options()).get_or_404(tag_id)
+        return fieldset.response(tag)
     
     @blp.response(
         202,
@@ -85,13 +270,28 @@ class Tag(MethodView):
         description="Returned if the tag is assigned to one or more items. In this case, the tag is not deleted."
     )
     def delete(self, tag_id):
-        tag = TagModel.query.get_or_404(tag_id)
+        # Check and delete in one statement, so no link can be added in between
+        linked = (
+            db.session.query(ItemTags.id).filter(ItemTags.tag_id == TagModel.id).exists()
+        )
+        store_id = db.session.execute(
+            delete(TagModel)
+            .where(TagModel.id == tag_id, ~linked)
+            .returning(TagModel.store_id)
+            .execution_options(synchronize_session=False)
+        ).scalar()
 
-        if not tag.items:
-            db.session.delete(tag)
-            db.session.commit()
-            return {"message": "Tag deleted."}
-        abort(
-            400,
-            message="Could not delete tag. Make sure tag is not associated with any items, then try again.",
-        )
\ No newline at end of file
+        if store_id is None:
+            if db.session.get(TagModel, tag_id) is None:
+                abort(404, message="Tag not found.")
+            abort(
+                400,
+                message="Could not delete tag. Make sure tag is not associated with any items, then try again.",
+            )
+
+        db.session.execute(
+            update(StoreModel).where(StoreModel.id == store_id).values(updated_at=utcnow())
+        )
+        db.session.commit()
+        response_cache.invalidate(f"tag:{tag_id}", f"store:{store_id}", f"store_tags:{store_id}")
+        return {"message": "Tag deleted."}
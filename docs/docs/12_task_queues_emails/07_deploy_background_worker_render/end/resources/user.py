@@ -1,8 +1,6 @@
-import os
 import redis
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
-from passlib.hash import pbkdf2_sha256
 from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
@@ -12,42 +10,56 @@ from flask_jwt_extended import (
 )
 from rq import Queue
 from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 
 from db import db
-from blocklist import BLOCKLIST
-from models import UserModel
-from schemas import UserSchema, UserRegisterSchema
-from tasks import send_user_registration_email
+from blocklist import forget_token_version, get_blocklist, revoke_all_tokens
+from claims import set_user_roles
+from idempotency import idempotent
+from models import RoleModel, UserModel
+from passwords import hash_password, verify_password
+from schemas import UserSchema, UserRegisterSchema, UserRolesSchema
+from settings import REDIS_URL
+from tasks import queue_registration_email
 
 
 blp = Blueprint("Users", "users", description="Operations on users")
-connection = redis.from_url(
-    os.getenv("REDIS_URL")
-)  # Get this from Render.com or run in Docker
+connection = redis.from_url(REDIS_URL)  # Get this from Render.com or run in Docker
 queue = Queue("emails", connection=connection)
 
 
 @blp.route("/register")
 class UserRegister(MethodView):
+    @idempotent
     @blp.arguments(UserRegisterSchema)
     def post(self, user_data):
-        if UserModel.query.filter(
-            or_(
-                UserModel.username == user_data["username"],
-                UserModel.email == user_data["email"],
-            )
-        ).first():
+        # Cheap index-only probe, so taken names don't cost a password hash
+        taken = db.session.query(
+            UserModel.query.filter(
+                or_(
+                    UserModel.username == user_data["username"],
+                    UserModel.email == user_data["email"],
+                )
+            ).exists()
+        ).scalar()
+        if taken:
             abort(409, message="A user with that username or email already exists.")
 
         user = UserModel(
             username=user_data["username"],
             email=user_data["email"],
-            password=pbkdf2_sha256.hash(user_data["password"]),
+            password=hash_password(user_data["password"]),
         )
-        db.session.add(user)
-        db.session.commit()
+        # The unique constraints decide, should another request win the race
+        try:
+            db.session.add(user)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            abort(409, message="A user with that username or email already exists.")
 
-        queue.enqueue(send_user_registration_email, user.email, user.username)
+        # Not user.email: reading the expired instance would SELECT it again
+        queue_registration_email(queue, user_data["email"], user_data["username"])
 
         return {"message": "User created successfully."}, 201
 
@@ -60,10 +72,22 @@ class UserLogin(MethodView):
             UserModel.username == user_data["username"]
         ).first()
 
-        if user and pbkdf2_sha256.verify(user_data["password"], user.password):
-            access_token = create_access_token(identity=str(user.id), fresh=True)
-            refresh_token = create_refresh_token(identity=str(user.id))
-            return {"access_token": access_token, "refresh_token": refresh_token}
+        if user:
+            valid, new_hash = verify_password(user_data["password"], user.password)
+            if valid:
+                if new_hash:
+                    # The stored hash uses an outdated scheme or cost
+                    user.password = new_hash
+                    db.session.commit()
+
+                claims = {"token_version": user.token_version}
+                access_token = create_access_token(
+                    identity=str(user.id), fresh=True, additional_claims=claims
+                )
+                refresh_token = create_refresh_token(
+                    identity=str(user.id), additional_claims=claims
+                )
+                return {"access_token": access_token, "refresh_token": refresh_token}
 
         abort(401, message="Invalid credentials.")
 
@@ -73,7 +97,11 @@ class TokenRefresh(MethodView):
     @jwt_required(refresh=True)
     def post(self):
         current_user = get_jwt_identity()
-        new_token = create_access_token(identity=current_user, fresh=False)
+        # The refresh token was just checked against the current version
+        claims = {"token_version": get_jwt().get("token_version", 0)}
+        new_token = create_access_token(
+            identity=current_user, fresh=False, additional_claims=claims
+        )
         return {"access_token": new_token}
 
 
@@ -81,11 +109,33 @@ class TokenRefresh(MethodView):
 class UserLogout(MethodView):
     @jwt_required()
     def post(self):
-        jti = get_jwt()["jti"]
-        BLOCKLIST.add(jti)
+        jwt = get_jwt()
+        get_blocklist().add(jwt["jti"], jwt["exp"])
         return {"message": "Successfully logged out."}
 
 
+@blp.route("/logout/all")
+class UserLogoutAll(MethodView):
+    @jwt_required()
+    def post(self):
+        revoke_all_tokens(int(get_jwt_identity()))
+        db.session.commit()
+        return {"message": "Successfully logged out of all sessions."}
+
+
+@blp.route("/blocklist/metrics")
+class BlocklistMetrics(MethodView):
+    @jwt_required()
+    def get(self):
+        jwt = get_jwt()
+        if not jwt.get("is_admin"):
+            abort(401, message="Admin privilege required.")
+
+        # Counts are per worker process, like the filter itself
+        blocklist = get_blocklist()
+        return getattr(blocklist, "metrics", {})
+
+
 @blp.route("/user/<int:user_id>")
 class User(MethodView):
     @blp.response(200, UserSchema)
@@ -97,4 +147,28 @@ class User(MethodView):
         user = UserModel.query.get_or_404(user_id)
         db.session.delete(user)
         db.session.commit()
+        # Tokens of a deleted user no longer match any version
+        forget_token_version(user_id)
         return {"message": "User deleted."}, 200
+
+
+@blp.route("/user/<int:user_id>/roles")
+class UserRoleList(MethodView):
+    @jwt_required()
+    @blp.arguments(UserRolesSchema)
+    @blp.response(200, UserSchema)
+    def put(self, role_data, user_id):
+        jwt = get_jwt()
+        if not jwt.get("is_admin"):
+            abort(401, message="Admin privilege required.")
+
+        user = UserModel.query.get_or_404(user_id)
+        names = set(role_data["roles"])
+        roles = RoleModel.query.filter(RoleModel.name.in_(names)).all()
+        unknown = names - {role.name for role in roles}
+        if unknown:
+            abort(422, message=f"Unknown roles: {', '.join(sorted(unknown))}.")
+
+        set_user_roles(user, roles)
+        db.session.commit()
+        return user
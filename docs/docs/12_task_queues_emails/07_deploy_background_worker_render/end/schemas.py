@@ -1,4 +1,4 @@
-from marshmallow import Schema, fields
+from marshmallow import Schema, ValidationError, fields, validate
 
 
 class PlainItemSchema(Schema):
@@ -23,12 +23,52 @@ class ItemUpdateSchema(Schema):
     store_id = fields.Int()
 
 
+class ItemRowSchema(PlainItemSchema):
+    store_id = fields.Int()
+
+
 class ItemSchema(PlainItemSchema):
     store_id = fields.Int(required=True, load_only=True)
     store = fields.Nested(PlainStoreSchema(), dump_only=True)
     tags = fields.List(fields.Nested(PlainTagSchema()), dump_only=True)
 
 
+class ItemBulkSchema(ItemSchema):
+    """A JSON array of items, loaded as `{"items": [...], "errors": {...}}`.
+
+    Invalid rows don't fail the load, their messages are in `errors` by row
+    index, so the view can report them and, unless atomic, create the others.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(many=True, **kwargs)
+
+    def load(self, data, **kwargs):
+        if not isinstance(data, list):
+            raise ValidationError("Expected a JSON array of items.")
+        try:
+            return {"items": super().load(data, **kwargs), "errors": {}}
+        except ValidationError as err:
+            # valid_data keeps one entry per row
+            return {"items": err.valid_data, "errors": err.messages}
+
+
+class ItemBulkArgsSchema(Schema):
+    atomic = fields.Bool(load_default=True)
+    batch_size = fields.Int(validate=validate.Range(min=1, max=1000))
+
+
+class ItemBulkRowSchema(Schema):
+    index = fields.Int()
+    id = fields.Int()
+    errors = fields.Dict()
+
+
+class ItemBulkResultSchema(Schema):
+    created = fields.Int()
+    results = fields.List(fields.Nested(ItemBulkRowSchema()))
+
+
 class StoreSchema(PlainStoreSchema):
     items = fields.List(fields.Nested(PlainItemSchema()), dump_only=True)
     tags = fields.List(fields.Nested(PlainTagSchema()), dump_only=True)
@@ -40,17 +80,49 @@ class TagSchema(PlainTagSchema):
     items = fields.List(fields.Nested(PlainItemSchema()), dump_only=True)
 
 
+class ItemTagIdsSchema(Schema):
+    tag_ids = fields.List(fields.Int(), required=True)
+
+
 class TagAndItemSchema(Schema):
     message = fields.Str()
     item = fields.Nested(ItemSchema)
     tag = fields.Nested(TagSchema)
 
 
+class RoleSchema(Schema):
+    id = fields.Int(dump_only=True)
+    name = fields.Str(required=True)
+
+
 class UserSchema(Schema):
     id = fields.Int(dump_only=True)
     username = fields.Str(required=True)
-    password = fields.Str(required=True)
+    password = fields.Str(required=True, load_only=True)
+    roles = fields.Pluck(RoleSchema, "name", many=True, dump_only=True)
+
+
+class UserRolesSchema(Schema):
+    roles = fields.List(fields.Str(), required=True)
 
 
 class UserRegisterSchema(UserSchema):
     email = fields.Str(required=True)
+
+
+class CatalogFormatSchema(Schema):
+    format = fields.Str(load_default="ndjson", validate=validate.OneOf(["ndjson", "csv"]))
+
+
+class CatalogImportResultSchema(Schema):
+    stores = fields.Int()
+    tags = fields.Int()
+    items = fields.Int()
+    links = fields.Int()
+
+
+class IngestJobSchema(Schema):
+    job_id = fields.Str()
+    status = fields.Str()
+    counts = fields.Nested(CatalogImportResultSchema())
+    errors = fields.List(fields.Str())
@@ -4,4 +4,4 @@ from dotenv import load_dotenv
 load_dotenv()
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
-QUEUES = ["emails", "default"]
+QUEUES = ["emails", "ingest", "default"]
@@ -0,0 +1,75 @@
+"""
+streaming.py
+
+Streaming responses for whole collections.
+
+Passing `?stream=true`, or sending `Accept: application/x-ndjson`, makes a
+collection endpoint return every row instead of one page. Rows are read from
+the database `CHUNK_SIZE` at a time (with a server-side cursor where the driver
+supports it), each chunk is dumped with the endpoint's schema, and the JSON is
+written to the client as it is produced. Memory use stays flat however large
+the table is.
+"""
+import json
+
+import marshmallow as ma
+from flask import Response, request, stream_with_context
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+CHUNK_SIZE = 500
+
+
+class StreamArgsSchema(ma.Schema):
+    class Meta:
+        unknown = ma.EXCLUDE
+
+    stream = ma.fields.Boolean(
+        load_default=False,
+        metadata={
+            "description": "Return the whole collection as a streamed JSON array "
+            f"(or NDJSON with `Accept: {NDJSON_MIMETYPE}`) instead of one page."
+        },
+    )
+
+
+def wants_stream(stream_args):
+    return stream_args["stream"] or request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_query(query, schema, chunk_size=CHUNK_SIZE):
+    """Stream every row of `query`, dumped with `schema`, as JSON or NDJSON.
+
+    `schema` must dump a single object; it's called once per chunk with many=True.
+    """
+    ndjson = request.accept_mimetypes.best == NDJSON_MIMETYPE
+    rows = query.yield_per(chunk_size)
+
+    def generate():
+        if not ndjson:
+            yield "["
+        first = True
+        for chunk in _chunks(rows, chunk_size):
+            lines = [json.dumps(obj) for obj in schema.dump(chunk, many=True)]
+            if ndjson:
+                yield "\n".join(lines) + "\n"
+            else:
+                yield ("" if first else ",") + ",".join(lines)
+            first = False
+        if not ndjson:
+            yield "]"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=NDJSON_MIMETYPE if ndjson else "application/json",
+    )
@@ -1,23 +1,146 @@
+import json
+import logging
 import os
-import requests
+import time
+import click
 from dotenv import load_dotenv
 import jinja2
+import requests
+from rq import Queue, Retry, get_current_job
+
+import mailgun
 
 load_dotenv()
 
 DOMAIN = os.getenv("MAILGUN_DOMAIN")
-template_loader = jinja2.FileSystemLoader("templates")
-template_env = jinja2.Environment(loader=template_loader)
+# Registration emails are sent in batches of up to this many recipients
+# (Mailgun takes 1000), waiting up to this long for a batch to fill
+REGISTRATION_EMAIL_BATCH_SIZE = int(os.getenv("REGISTRATION_EMAIL_BATCH_SIZE", 500))
+REGISTRATION_EMAIL_BATCH_WAIT_MS = int(os.getenv("REGISTRATION_EMAIL_BATCH_WAIT_MS", 1000))
+REGISTRATION_EMAILS_KEY = "registration-emails"
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+# Written by `flask build-email-templates`, the inlined HTML goes in html/
+COMPILED_TEMPLATES_DIR = os.path.join(TEMPLATES_DIR, "compiled")
+# Set TEMPLATE_AUTO_RELOAD=1 when editing templates, it stats them per render
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD") == "1"
+
+
+# A child of RQ's worker logger, so it goes wherever the worker logs
+logger = logging.getLogger("rq.worker.tasks")
+
+
+def inline_html(source):
+    """The HTML of a template source with its CSS inlined.
+
+    Use Jinja tags in text only, the inliner may escape them in attributes.
+    """
+    from premailer import Premailer
+
+    return Premailer(
+        source,
+        include_star_selectors=True,
+        strip_important=False,
+        # Explicit in the sources, and "100% !important" isn't an attribute value
+        disable_basic_attributes=["width", "height"],
+        disable_validation=True,
+        cssutils_logging_level=logging.CRITICAL,
+    ).transform()
+
+
+class SourceLoader(jinja2.FileSystemLoader):
+    """Loads `name.html` from its source, `name.original.html`, CSS not inlined."""
+
+    def get_source(self, environment, template):
+        source_name = template.removesuffix(".html") + ".original.html"
+        return super().get_source(environment, source_name)
+
+    def list_templates(self):
+        return [
+            name.removesuffix(".original.html") + ".html"
+            for name in super().list_templates()
+            if name.endswith(".original.html")
+        ]
+
+
+class InliningLoader(SourceLoader):
+    """Loads `name.html` from its source, inlining the CSS as it loads.
+
+    Used for templates not built by `flask build-email-templates`, and when
+    editing them, so emails never go out with their CSS in a `<style>` tag.
+    """
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+        return inline_html(source), filename, uptodate
+
+
+template_loader = InliningLoader(TEMPLATES_DIR)
+if os.path.isdir(COMPILED_TEMPLATES_DIR) and not TEMPLATE_AUTO_RELOAD:
+    # Templates not built yet are still inlined from their sources
+    loader = jinja2.ChoiceLoader([jinja2.ModuleLoader(COMPILED_TEMPLATES_DIR), template_loader])
+else:
+    if not TEMPLATE_AUTO_RELOAD:
+        logger.warning(
+            "Email templates aren't built, inlining their CSS at startup. "
+            "Run `flask build-email-templates` to do it once instead."
+        )
+    loader = template_loader
+template_env = jinja2.Environment(
+    loader=loader,
+    # Compiled templates are kept on disk, so new worker processes skip compiling
+    bytecode_cache=jinja2.FileSystemBytecodeCache(os.getenv("TEMPLATE_BYTECODE_CACHE_DIR")),
+    auto_reload=TEMPLATE_AUTO_RELOAD,
+)
+
+
+# Loaded once, when the worker imports this module
+templates = {name: template_env.get_template(name) for name in template_loader.list_templates()}
 
 
 def render_template(template_filename, **context):
-    return template_env.get_template(template_filename).render(**context)
+    if template_env.auto_reload:
+        return template_env.get_template(template_filename).render(**context)
+    return templates[template_filename].render(**context)
+
+
+def inline_css(source_dir, output_dir):
+    """Write each `name.original.html` template of `source_dir` as `name.html`
+    in `output_dir`, with its CSS inlined. Returns the names written.
+    """
+    built = []
+    for name in SourceLoader(source_dir).list_templates():
+        with open(os.path.join(source_dir, name.removesuffix(".html") + ".original.html")) as f:
+            source = f.read()
+        target = os.path.join(output_dir, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "w") as f:
+            f.write(inline_html(source))
+        built.append(name)
+    return built
+
+
+@click.command("build-email-templates")
+@click.option(
+    "--output",
+    type=click.Path(file_okay=False),
+    default=COMPILED_TEMPLATES_DIR,
+    show_default=True,
+)
+def build_email_templates(output):
+    """Inline the CSS of email templates and precompile them for the worker."""
+    inlined_dir = os.path.join(output, "html")
+    for name in inline_css(TEMPLATES_DIR, inlined_dir):
+        click.echo(f"Inlined CSS into {os.path.join(inlined_dir, name)}.")
+    jinja2.Environment(loader=jinja2.FileSystemLoader(inlined_dir)).compile_templates(
+        output, zip=None, ignore_errors=False
+    )
+    click.echo(f"Compiled templates into {output}.")
 
 
 def send_simple_message(to, subject, body, html):
-    return requests.post(
-        f"https://api.mailgun.net/v3/{DOMAIN}/messages",
-        auth=("api", os.getenv("MAILGUN_API_KEY")),
+    return mailgun.post(
+        f"{DOMAIN}/messages",
         data={
             "from": f"Jose Salvatierra <mailgun@{DOMAIN}>",
             "to": [to],
@@ -28,10 +151,164 @@ def send_simple_message(to, subject, body, html):
     )
 
 
-def send_user_registration_email(email, username):
-    return send_simple_message(
-        email,
+def send_batch_message(recipients, subject, body, html):
+    """Send one email per recipient with a single API call.
+
+    `recipients` maps each address to its variables, which the bodies use as
+    `%recipient.<name>%`.
+    """
+    return mailgun.post(
+        f"{DOMAIN}/messages",
+        data={
+            "from": f"Jose Salvatierra <mailgun@{DOMAIN}>",
+            "to": list(recipients),
+            "subject": subject,
+            "text": body,
+            "html": html,
+            "recipient-variables": json.dumps(recipients),
+        },
+    )
+
+
+def registration_email(username):
+    return (
         "Successfully signed up",
         f"Hi {username}! You have successfully signed up to the Stores REST API.",
         render_template("email/action.html", username=username),
     )
+
+
+def send_user_registration_email(email, username):
+    return send_simple_message(email, *registration_email(username))
+
+
+def queue_registration_email(queue, email, username):
+    """Add a registration email to the next batch sent by the worker."""
+    queue.connection.rpush(
+        REGISTRATION_EMAILS_KEY, json.dumps({"email": email, "username": username})
+    )
+    _schedule_registration_email_batch(queue)
+
+
+def _schedule_registration_email_batch(queue):
+    # One batch job at a time. The flag expires in case its worker dies.
+    if queue.connection.set(f"{REGISTRATION_EMAILS_KEY}:scheduled", 1, nx=True, ex=300):
+        queue.enqueue(send_registration_email_batch)
+
+
+def send_registration_emails(recipients):
+    """Send registration emails in one batch.
+
+    Returns the recipients whose emails certainly weren't sent, then those
+    whose emails may or may not have been (e.g. after a read timeout).
+    """
+    variables = {recipient["email"]: {"username": recipient["username"]} for recipient in recipients}
+    # Rendered once, Mailgun fills in each recipient's username
+    try:
+        response = send_batch_message(variables, *registration_email("%recipient.username%"))
+    except requests.RequestException as e:
+        return (recipients, []) if mailgun.not_sent(e) else ([], recipients)
+    if response.ok:
+        return [], []
+    return (recipients, []) if mailgun.not_accepted(response) else ([], recipients)
+
+
+def send_registration_email_batch():
+    """Drain up to a batch of pending registration emails and send them.
+
+    Recipients of a batch that certainly failed are queued as individual
+    emails with retries, so one bad address doesn't hold back the others. When
+    Mailgun may have accepted the batch, they're only recorded as `unknown`, as
+    sending again could email them twice.
+    """
+    job = get_current_job()
+    connection = job.connection
+    queue = Queue(job.origin, connection=connection)
+
+    deadline = time.monotonic() + REGISTRATION_EMAIL_BATCH_WAIT_MS / 1000
+    while (
+        connection.llen(REGISTRATION_EMAILS_KEY) < REGISTRATION_EMAIL_BATCH_SIZE
+        and time.monotonic() < deadline
+    ):
+        time.sleep(0.05)
+    pending = connection.lpop(REGISTRATION_EMAILS_KEY, REGISTRATION_EMAIL_BATCH_SIZE) or []
+
+    # Emails queued from now on need another batch
+    connection.delete(f"{REGISTRATION_EMAILS_KEY}:scheduled")
+    if connection.llen(REGISTRATION_EMAILS_KEY):
+        _schedule_registration_email_batch(queue)
+
+    recipients = [json.loads(recipient) for recipient in pending]
+    if not recipients:
+        return
+    failed, unknown = send_registration_emails(recipients)
+    if unknown:
+        logger.warning(
+            "Registration emails to %d recipients may not have been sent.", len(unknown)
+        )
+    for recipient in failed:
+        queue.enqueue(
+            send_user_registration_email,
+            recipient["email"],
+            recipient["username"],
+            retry=Retry(max=3, interval=[10, 60, 300]),
+        )
+    job.meta.update(
+        sent=len(recipients) - len(failed) - len(unknown),
+        failed=[r["email"] for r in failed],
+        unknown=[r["email"] for r in unknown],
+    )
+    job.save_meta()
+
+
+def delete_store(store_id):
+    # Imported here so sending emails doesn't need the whole web app
+    from app import create_app
+    from resources.store import delete_store_rows
+
+    app = create_app()
+    with app.app_context():
+        delete_store_rows(store_id, chunk_size=app.config["STORE_DELETE_CHUNK_SIZE"])
+
+
+def _payload_lines(connection, key, chunk_size=1024 * 1024):
+    """Lines of a payload stored in Redis, read a chunk at a time."""
+    start = 0
+    rest = b""
+    while chunk := connection.getrange(key, start, start + chunk_size - 1):
+        start += len(chunk)
+        lines = (rest + chunk).splitlines(keepends=True)
+        rest = b"" if lines[-1].endswith(b"\n") else lines.pop()
+        for line in lines:
+            yield line.decode()
+    if rest:
+        yield rest.decode()
+
+
+def ingest_catalog(payload_key, file_format):
+    from app import create_app
+    from catalog import RECORD_TYPES, READERS, import_records
+
+    job = get_current_job()
+    job.meta.update(counts={}, errors=[])
+    job.save_meta()
+
+    def record_progress(counts):
+        job.meta["counts"] = {f"{record_type}s": counts[record_type] for record_type in RECORD_TYPES}
+        job.save_meta()
+
+    app = create_app()
+    with app.app_context():
+        try:
+            import_records(
+                READERS[file_format](_payload_lines(job.connection, payload_key)),
+                batch_size=app.config["INGEST_BATCH_SIZE"],
+                on_batch=record_progress,
+            )
+        except Exception as e:
+            # Batches committed so far stay, the counts say how far it got
+            job.meta["errors"].append(str(e))
+            job.save_meta()
+            raise
+        finally:
+            job.connection.delete(payload_key)
@@ -0,0 +1,4 @@
+#!/bin/sh
+
+# SimpleWorker runs jobs in this process, so connection pools outlive each job
+exec rq worker -c settings -w rq.worker.SimpleWorker